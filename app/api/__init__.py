@@ -4,8 +4,23 @@ This package contains all API endpoints for the Quincaillerie & SME Management A
 Each module defines a Blueprint for a specific functionality area.
 """
 
-# Import all blueprints for proper initialization
-from . import auth, dashboard, inventory, sales, finance, reports, ai_insights
-from . import settings
-from . import admin
-from . import notifications
+import importlib
+
+# Submodules are imported on first attribute access (PEP 562) so that importing
+# one blueprint does not pull in every other module and its dependencies
+_SUBMODULES = {
+    'auth', 'dashboard', 'inventory', 'sales', 'finance', 'reports', 'ai_insights',
+    'settings', 'admin', 'notifications',
+}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        module = importlib.import_module(f'.{name}', __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
@@ -2,176 +2,296 @@
 # -*- coding: utf-8 -*-
 """Admin API blueprint for system settings and backups"""
 
-from flask import Blueprint, request, jsonify, session, send_file, make_response
+from flask import Blueprint, request, jsonify, session, send_file, make_response, current_app, Response, g
 import os
 import json
+import gzip
+import hashlib
 import logging
-import traceback
 import sys
 import platform
+import re
 import shutil
-import flask
-from datetime import datetime
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from datetime import datetime, date
+from functools import lru_cache
 
 # Add parent directory to Python path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 # Import DatabaseManager from the unified location
 from db.database import DatabaseManager
+from .json_utils import ojsonify
 
-# Optional dependency: psutil
+
+@lru_cache(maxsize=1)
+def _psutil():
+    """Optional dependency psutil, imported on first use by the system-info endpoint"""
+    try:
+        import psutil  # type: ignore
+    except Exception:  # pragma: no cover - optional dep may be absent
+        return None  # Fallback handled in endpoint
+    # Start the CPU sampling window so later cpu_percent(interval=None) calls don't block
+    psutil.cpu_percent(interval=None)
+    return psutil
+
+# Optional dependency: orjson (faster JSON responses)
 try:
-    import psutil  # type: ignore
+    import orjson  # type: ignore
 except Exception:  # pragma: no cover - optional dep may be absent
-    psutil = None  # Fallback handled in endpoint
+    orjson = None  # Fallback to Flask's jsonify
 
 # Enhanced DatabaseManager to fix app settings issue
 class FixedDatabaseManager(DatabaseManager):
-    def set_app_settings(self, settings_data):
-        """Enhanced version to handle different table structures"""
-        conn = self.get_connection()
+    # Column names per table; the schema doesn't change while the app runs
+    _schema_cache = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # get_app_settings() result, valid while _settings_version and the files are unchanged
+        self._settings_cache = None
+        self._settings_version = 0
+        self._has_app_settings = False
+        self._has_settings = False
+        self._schema_probed = False
+        self.reload_schema()
+
+    def reload_schema(self):
+        """Probe which settings tables exist and forget cached column lists.
+        Runs once at startup; call it again after a schema migration.
+        """
+        self._schema_cache.clear()
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('app_settings', 'settings')")
+                names = {row[0] for row in cursor.fetchall()}
+                self._has_app_settings = 'app_settings' in names
+                self._has_settings = 'settings' in names
+                if self._has_settings:
+                    self._table_columns(cursor, 'settings')
+        except Exception as e:
+            logger.warning("Could not probe settings schema: %s", e)
+            names = set()
+        # A database that has no settings table yet (init_database() not run) is probed again on next use
+        self._schema_probed = bool(names)
+        logger.debug("Tables: app_settings=%s, settings=%s", self._has_app_settings, self._has_settings)
+
+    def _table_columns(self, cursor, table):
+        """Return the (cached) set of column names of table"""
+        columns = self._schema_cache.get(table)
+        if columns is None:
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = frozenset(row[1] for row in cursor.fetchall())
+            self._schema_cache[table] = columns
+        return columns
+
+    def _db_signature(self):
+        """(mtime, size) of the database and its WAL: changes with any commit, from any process"""
+        sig = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def get_app_settings(self):
+        """Cached get_app_settings(); callers get their own copy of the dict"""
+        key = (self._settings_version, self._db_signature())
+        cached = self._settings_cache
+        if cached is not None and cached[0] == key:
+            return dict(cached[1])
+        settings = super().get_app_settings()
+        if settings:
+            self._settings_cache = (key, settings)
+        return dict(settings)
+
+    def settings_etag(self):
+        """Validator for get_app_settings(): same inputs as its cache key"""
+        return _make_etag(self._settings_version, self._db_signature())
+
+    def _invalidate_settings(self):
+        self._settings_version += 1
+        self._settings_cache = None
+
+    _UPSERT_APP_SETTING = '''
+        INSERT INTO app_settings (key, value)
+        VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    '''
+
+    def _upsert_settings_per_key(self, conn, rows):
+        """Retry a failed batch key by key, each in its own SAVEPOINT, in one transaction.
+        Returns the keys that could not be written.
+        """
         cursor = conn.cursor()
-        
+        failed_keys = []
+        if not conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        for key, value in rows:
+            cursor.execute('SAVEPOINT setting_key')
+            try:
+                cursor.execute(self._UPSERT_APP_SETTING, (key, value))
+            except Exception as e:
+                logger.error("Error setting parameter %s: %s", key, e)
+                cursor.execute('ROLLBACK TO setting_key')
+                failed_keys.append(key)
+            cursor.execute('RELEASE setting_key')
+        conn.commit()
+        return failed_keys
+
+    def set_app_settings(self, settings_data):
+        """Enhanced version to handle different table structures.
+        Returns dict(success: bool, failed_keys: list) - failed_keys lists settings that
+        could not be stored when the rest of the batch went through.
+        """
+        if not self._schema_probed:
+            self.reload_schema()
         try:
-            # First check if the app_settings table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='app_settings'")
-            app_settings_exists = cursor.fetchone() is not None
-            
-            # Check if the settings table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
-            settings_exists = cursor.fetchone() is not None
-            
-            logger.debug(f"Tables: app_settings={app_settings_exists}, settings={settings_exists}")
+            return self._set_app_settings(settings_data)
+        finally:
+            # Bumped after the write transaction has committed (or rolled back)
+            self._invalidate_settings()
+
+    def _set_app_settings(self, settings_data):
+        with self.acquire() as conn:
+            cursor = conn.cursor()
             
-            # Try the app_settings table first (key-value pairs)
-            if app_settings_exists:
-                try:
-                    for key, value in settings_data.items():
-                        # Convert complex types to JSON
-                        if isinstance(value, (dict, list)):
-                            value = json.dumps(value)
-                        else:
-                            value = str(value)
-                            
-                        cursor.execute('''
-                            REPLACE INTO app_settings (key, value)
-                            VALUES (?, ?)
-                        ''', (key, value))
-                    conn.commit()
-                    return {'success': True}
-                except Exception as e:
-                    logger.warning(f"Failed to update app_settings table: {e}")
-                    conn.rollback()
+            try:
+                # Try the app_settings table first (key-value pairs)
+                if self._has_app_settings:
+                    # Convert complex types to JSON
+                    rows = [(key, json.dumps(value) if isinstance(value, (dict, list)) else str(value))
+                            for key, value in settings_data.items()]
+                    try:
+                        # One write transaction and one batched upsert for every key
+                        if not conn.in_transaction:
+                            cursor.execute('BEGIN IMMEDIATE')
+                        cursor.executemany(self._UPSERT_APP_SETTING, rows)
+                        conn.commit()
+                        return {'success': True, 'failed_keys': []}
+                    except Exception as e:
+                        logger.warning("Batch update of app_settings failed, retrying per key: %s", e)
+                        conn.rollback()
+                    try:
+                        failed_keys = self._upsert_settings_per_key(conn, rows)
+                        if len(failed_keys) < len(rows):
+                            return {'success': True, 'failed_keys': failed_keys}
+                    except Exception as e:
+                        logger.warning(f"Failed to update app_settings table: {e}")
+                        conn.rollback()
                     # Fall through to try settings table
             
-            # Try the settings table (row-based)
-            if settings_exists:
-                try:
-                    # Check if there's a record
-                    cursor.execute('SELECT * FROM settings WHERE id = 1')
-                    current = cursor.fetchone()
+                # Try the settings table (row-based)
+                if self._has_settings:
+                    try:
+                        # Check if there's a record
+                        cursor.execute('SELECT * FROM settings WHERE id = 1')
+                        current = cursor.fetchone()
                     
-                    if current:
-                        # Update existing settings
-                        updates = []
-                        params = []
+                        if current:
+                            # Update existing settings
+                            updates = []
+                            params = []
+                            columns = self._table_columns(cursor, 'settings')
                         
-                        for key, value in settings_data.items():
-                            if key in ['id', 'updated_at']:  # Skip these fields
-                                continue
-                            
-                            # See if column exists in the table
-                            cursor.execute(f"PRAGMA table_info(settings)")
-                            columns = [row[1] for row in cursor.fetchall()]
+                            for key, value in settings_data.items():
+                                if key in ['id', 'updated_at']:  # Skip these fields
+                                    continue
                             
-                            if key in columns:
-                                updates.append(f'{key} = ?')
-                                params.append(value)
-                            else:
-                                logger.warning(f"Column {key} not found in settings table")
+                                # See if column exists in the table
+                                if key in columns:
+                                    updates.append(f'{key} = ?')
+                                    params.append(value)
+                                else:
+                                    logger.warning(f"Column {key} not found in settings table")
                         
-                        if updates:
-                            # Add updated_at and ID
-                            updates.append('updated_at = CURRENT_TIMESTAMP')
+                            if updates:
+                                # Add updated_at and ID
+                                updates.append('updated_at = CURRENT_TIMESTAMP')
                             
-                            # Build update query
-                            query = f'''
-                                UPDATE settings
-                                SET {', '.join(updates)}
-                                WHERE id = 1
-                            '''
+                                # Build update query
+                                query = f'''
+                                    UPDATE settings
+                                    SET {', '.join(updates)}
+                                    WHERE id = 1
+                                '''
                             
-                            cursor.execute(query, params)
-                            conn.commit()
-                            return {'success': True}
-                    else:
-                        # Create a new settings row
-                        # This is more complex as we need to know the schema
-                        # Just try to insert default values that we know should exist
-                        try:
-                            cursor.execute('''
-                                INSERT INTO settings (
-                                    id, store_name, store_address, store_phone, 
-                                    tax_rate, currency, language, updated_at
-                                ) VALUES (
-                                    1, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP
-                                )
-                            ''', (
-                                settings_data.get('store_name', 'Quincaillerie'),
-                                settings_data.get('store_address', ''),
-                                settings_data.get('store_phone', ''),
-                                settings_data.get('tax_rate', 0),
-                                settings_data.get('currency', 'MRU'),
-                                settings_data.get('language', 'fr')
-                            ))
-                            conn.commit()
-                            return {'success': True}
-                        except Exception as inner_e:
-                            logger.error(f"Failed to create settings record: {inner_e}")
-                            conn.rollback()
+                                cursor.execute(query, params)
+                                conn.commit()
+                                return {'success': True}
+                        else:
+                            # Create a new settings row
+                            # This is more complex as we need to know the schema
+                            # Just try to insert default values that we know should exist
+                            try:
+                                cursor.execute('''
+                                    INSERT INTO settings (
+                                        id, store_name, store_address, store_phone, 
+                                        tax_rate, currency, language, updated_at
+                                    ) VALUES (
+                                        1, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP
+                                    )
+                                ''', (
+                                    settings_data.get('store_name', 'Quincaillerie'),
+                                    settings_data.get('store_address', ''),
+                                    settings_data.get('store_phone', ''),
+                                    settings_data.get('tax_rate', 0),
+                                    settings_data.get('currency', 'MRU'),
+                                    settings_data.get('language', 'fr')
+                                ))
+                                conn.commit()
+                                return {'success': True}
+                            except Exception as inner_e:
+                                logger.error(f"Failed to create settings record: {inner_e}")
+                                conn.rollback()
                 
-                except Exception as e:
-                    logger.warning(f"Failed to update settings table: {e}")
-                    conn.rollback()
+                    except Exception as e:
+                        logger.warning(f"Failed to update settings table: {e}")
+                        conn.rollback()
             
-            # If we got here, both attempts failed
-            logger.error("No valid settings table found")
-            return {'success': False, 'error': 'No settings table found in database'}
+                # If we got here, both attempts failed
+                logger.error("No valid settings table found")
+                return {'success': False, 'error': 'No settings table found in database'}
             
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error updating app settings: {e}")
-            return {'success': False, 'error': str(e)}
-        finally:
-            conn.close()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error updating app settings: {e}")
+                return {'success': False, 'error': str(e)}
 
 # Simplified SyncManager (if not available)
 class SyncManager:
-    def export_offline_data(self):
-        try:
-            # Create a basic data structure for the backup
-            data = {
-                'metadata': {
-                    'version': '1.0',
-                    'date': datetime.now().isoformat(),
-                    'type': 'backup'
-                },
-                'app_settings': {},
-                'users': []
-            }
-            
-            # Try to get app settings
-            try:
-                db = DatabaseManager()
-                data['app_settings'] = db.get_app_settings() or {}
-                data['users'] = db.get_users() or []
-            except Exception as e:
-                logger.warning(f"Could not retrieve data for backup: {e}")
-            
-            return {'success': True, 'data': data}
-        except Exception as e:
-            logger.error(f"Error in export_offline_data: {e}")
-            return {'success': False, 'error': str(e)}
+    def stream_offline_data(self, fp):
+        """Write the backup document ({metadata, app_settings, users}) to a binary file,
+        one user row at a time instead of materializing the whole dataset first.
+        Errors propagate to the caller.
+        """
+        def dump(obj):
+            if orjson is not None:
+                fp.write(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+            else:
+                fp.write(json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+        fp.write(b'{"metadata":')
+        dump({'version': '1.0', 'date': datetime.now().isoformat(), 'type': 'backup'})
+        fp.write(b',"app_settings":')
+        dump(db_manager.get_app_settings() or {})
+        fp.write(b',"users":[')
+        with db_manager.acquire() as conn:
+            cursor = conn.execute('''
+                SELECT id, username, role, language, created_at, last_login, is_active
+                FROM users
+                ORDER BY username
+            ''')
+            for i, row in enumerate(cursor):
+                if i:
+                    fp.write(b',')
+                dump(dict(row))
+        fp.write(b']}')
 
 # Configure more detailed logging
 logger = logging.getLogger(__name__)
@@ -180,153 +300,284 @@ logger.setLevel(logging.DEBUG)
 admin_bp = Blueprint('admin', __name__)
 
 # Add debug information about the environment
-logger.debug(f"Admin blueprint initialized")
-logger.debug(f"Python version: {sys.version}")
-logger.debug(f"Current working directory: {os.getcwd()}")
-logger.debug(f"Script path: {os.path.abspath(__file__)}")
+logger.debug("Admin blueprint initialized")
+logger.debug("Python version: %s", sys.version)
+logger.debug("Current working directory: %s", os.getcwd())
+logger.debug("Script path: %s", os.path.abspath(__file__))
 
 # Initialize database manager with our fixed version
 db_manager = FixedDatabaseManager()
-logger.debug(f"Fixed database manager initialized, path: {db_manager.db_path if hasattr(db_manager, 'db_path') else 'unknown'}")
+logger.debug("Fixed database manager initialized, path: %s", db_manager.db_path if hasattr(db_manager, 'db_path') else 'unknown')
 
 # Initialize sync manager
 sync_manager = SyncManager()
 
 # Use absolute path for backups directory - ensure it's in an accessible location
 BACKUP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backups'))
-os.makedirs(BACKUP_DIR, exist_ok=True)
-logger.debug(f"Backup directory set to: {BACKUP_DIR}")
+LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+APP_LOG_PATH = os.path.join(LOGS_DIR, 'app.log')
+logger.debug("Backup directory set to: %s", BACKUP_DIR)
+_backup_dir_ready = False
+
+
+def _ensure_backup_dir():
+    """Create the backups directory on first use rather than at import time"""
+    global _backup_dir_ready
+    if not _backup_dir_ready:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        _backup_dir_ready = True
+
+
+# Backups are written off the request path by a single thread per process; the POST
+# returns a job id (the backup name without .json) whose state lives in BACKUP_DIR as
+# <job_id>.job, so a status poll answered by any gunicorn worker sees it. The .job file
+# is removed once the backup is published: the backup file itself then means 'done'.
+_BACKUP_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='backup')
+_BACKUP_JOB_ID = re.compile(r'backup_\d{8}_\d{6}')
+
+
+def _backup_job_path(job_id):
+    return os.path.join(BACKUP_DIR, job_id + '.job')
+
+
+def _set_backup_job(job_id, **state):
+    """Replace the job's state file (atomically, so readers never see a partial write)"""
+    path = _backup_job_path(job_id)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def _get_backup_job(job_id):
+    """Job state dict, or None for an unknown job id"""
+    if not _BACKUP_JOB_ID.fullmatch(job_id):
+        return None
+    if os.path.exists(os.path.join(BACKUP_DIR, job_id + '.json')):
+        return {'status': 'done', 'backup_id': job_id + '.json', 'error': None}
+    try:
+        with open(_backup_job_path(job_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_backup(job_id, path, user_id):
+    """Worker: stream the backup to disk, then publish it and its gzip sibling"""
+    backup_id = os.path.basename(path)
+    _set_backup_job(job_id, status='running', backup_id=backup_id, error=None)
+    tmp_path = path + '.part'
+    gz_tmp_path = path + '.gz.part'
+    try:
+        # Written under temporary names and renamed into place (os.replace is atomic),
+        # so the listing and restore never see a partial file
+        with open(tmp_path, 'wb', buffering=1 << 20) as f:
+            sync_manager.stream_offline_data(f)
+            f.flush()
+            # Durable before the rename; this runs on the backup worker, not the request
+            os.fsync(f.fileno())
+        # Pre-compressed sibling served to clients that accept gzip; level 1 keeps
+        # most of the size win at a fraction of the CPU
+        with open(tmp_path, 'rb') as src, gzip.open(gz_tmp_path, 'wb', compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(gz_tmp_path, path + '.gz')
+        os.replace(tmp_path, path)
+        os.remove(_backup_job_path(job_id))
+        db_manager.log_user_action(user_id, 'create_backup', f'Backup {path}')
+        logger.debug("Backup written: %s", path)
+    except Exception as e:
+        logger.exception("Error creating backup: %s", e)
+        for leftover in (tmp_path, gz_tmp_path, path + '.gz'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        _set_backup_job(job_id, status='error', backup_id=backup_id, error=str(e))
+
+
+# Last backup listing, keyed by the directory's mtime (changes on every create/delete/rename)
+_backup_list_cache = (None, None)
+
+
+def _list_backups():
+    """Backup files newest first, re-scanned only when BACKUP_DIR changed"""
+    global _backup_list_cache
+    try:
+        dir_mtime = os.stat(BACKUP_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    cached_mtime, cached = _backup_list_cache
+    if cached_mtime == dir_mtime:
+        return cached
+    with os.scandir(BACKUP_DIR) as it:
+        entries = [(entry.name, entry.stat()) for entry in it if entry.name.endswith('.json')]
+    # Single sort, newest first, on the numeric mtime (keeps order within a day)
+    entries.sort(key=lambda e: e[1].st_mtime, reverse=True)
+    # date.isoformat() gives YYYY-MM-DD without the strftime format interpreter
+    backups = [{
+        'id': name,
+        'date': date.fromtimestamp(stat.st_mtime).isoformat(),
+        'size': f"{stat.st_size / 1024:.1f} KB",
+        'type': 'Manuel'
+    } for name, stat in entries]
+    # One tuple assignment so concurrent readers never see a mismatched pair
+    _backup_list_cache = (dir_mtime, backups)
+    return backups
+
+
+def _make_etag(*parts):
+    """Short opaque ETag derived from the values that determine a response"""
+    return hashlib.blake2s(repr(parts).encode(), digest_size=8).hexdigest()
+
+
+def _conditional(etag, build):
+    """304 when the client already holds etag, else build() with the ETag attached"""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    # Let browsers keep the copy but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _loads(buf):
+    """Parse JSON bytes directly (orjson when installed, no intermediate str)"""
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
+
+
+def _parse_body():
+    """Request payload as a dict: the raw body parsed as JSON, else the form fields"""
+    # cache=True keeps the bytes around so request.form can still be parsed from them
+    buf = request.get_data(cache=True)
+    logger.debug("Raw body: %d bytes", len(buf))
+    if buf:
+        try:
+            data = _loads(buf)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+    return request.form.to_dict()
+
+
+def _err(message, status, **extra):
+    """Error response: {'success': False, 'message': message, **extra} with the given status"""
+    response = ojsonify({'success': False, 'message': message, **extra})
+    response.status_code = status
+    return response
 
 
 def require_admin():
-    """Check if the current user is an admin and return an error response if not"""
-    logger.debug(f"Session data: {session}")
+    """Check if the current user is an admin and return an error response if not.
+    The outcome is cached on flask.g so repeated checks within a request are free.
+    """
+    if '_admin_check' in g:
+        return g._admin_check
+    g._admin_check = _check_admin_session()
+    return g._admin_check
+
+
+# CORS headers shared by every admin endpoint; preflights are answered before routing
+_CORS_ORIGIN = ('Access-Control-Allow-Origin', '*')
+_PREFLIGHT_HEADERS = (
+    _CORS_ORIGIN,
+    ('Access-Control-Allow-Headers', 'Content-Type,Authorization'),
+    ('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS'),
+)
+_PREFLIGHT_BODY = b'{"success":true}'
+
+
+@admin_bp.before_request
+def _admin_before_request():
+    """Answer CORS preflights and enforce admin access for the whole blueprint"""
+    if request.method == 'OPTIONS':
+        return Response(_PREFLIGHT_BODY, mimetype='application/json', headers=_PREFLIGHT_HEADERS)
+    return require_admin()
+
+
+@admin_bp.after_request
+def _admin_after_request(response):
+    if _CORS_ORIGIN[0] not in response.headers:
+        response.headers[_CORS_ORIGIN[0]] = _CORS_ORIGIN[1]
+    return response
+
+
+def _check_admin_session():
+    logger.debug("Session keys: %s", list(session.keys()) if session else None)
     
     # Check if session is valid
     if not session:
         logger.warning("Admin access attempt with empty session")
-        response = jsonify({'success': False, 'message': 'Session invalide, veuillez vous reconnecter'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 401
+        return _err('Session invalide, veuillez vous reconnecter', 401)
     
     # Check if user is logged in
     if 'user_id' not in session:
         logger.warning("Admin access attempt without user_id in session")
-        response = jsonify({'success': False, 'message': 'Accès administrateur requis, veuillez vous connecter'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 401
+        return _err('Accès administrateur requis, veuillez vous connecter', 401)
     
     # Check if user is admin
     if session.get('user_role') != 'admin':
         logger.warning(f"Non-admin access attempt: user_id={session.get('user_id')}, role={session.get('user_role')}")
-        response = jsonify({'success': False, 'message': 'Accès administrateur requis, privilèges insuffisants'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 403
+        return _err('Accès administrateur requis, privilèges insuffisants', 403)
     
     # All checks passed
-    logger.debug(f"Admin access granted for user_id={session.get('user_id')}")
+    logger.debug("Admin access granted for user_id=%s", session.get('user_id'))
     return None
 
 
 @admin_bp.route('/settings', methods=['GET', 'POST', 'OPTIONS'])
 def app_settings():
-    # Handle CORS preflight request
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
-        return response
-        
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-
     if request.method == 'GET':
         try:
             logger.debug("Getting app settings")
-            settings = db_manager.get_app_settings()
-            logger.debug(f"Retrieved settings: {settings}")
-            response = jsonify({'success': True, 'settings': settings})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response
+            return _conditional(db_manager.settings_etag(),
+                                lambda: ojsonify({'success': True, 'settings': db_manager.get_app_settings()}))
         except Exception as e:
             error_msg = str(e)
-            stack_trace = traceback.format_exc()
-            logger.error(f"Error getting app settings: {error_msg}\n{stack_trace}")
-            response = jsonify({'success': False, 'message': 'Erreur lors de la récupération des paramètres', 'error': error_msg})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 500
+            logger.exception("Error getting app settings: %s", error_msg)
+            return _err('Erreur lors de la récupération des paramètres', 500, error=error_msg)
 
     try:
-        # Dump raw request data for debugging
-        raw_data = request.data.decode('utf-8') if request.data else None
-        logger.debug(f"Raw request data: {raw_data}")
-        
-        # Try different ways to get the data
-        if request.is_json:
-            data = request.get_json(silent=True) or {}
-            logger.debug(f"JSON data: {data}")
-        else:
-            try:
-                data = json.loads(raw_data) if raw_data else {}
-                logger.debug(f"Parsed raw data: {data}")
-            except Exception:
-                data = request.form.to_dict() or {}
-                logger.debug(f"Form data: {data}")
+        data = _parse_body()
         
         if not data:
-            response = jsonify({'success': False, 'message': 'Aucune donnée fournie'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 400
+            return _err('Aucune donnée fournie', 400)
         
-        logger.debug(f"Setting app settings with data: {data}")
+        logger.debug("Setting app settings with data: %s", data)
         
-        # Try direct update first
-        try:
-            # Direct update with all settings at once
-            db_manager.set_app_settings(data)
-            db_manager.log_user_action(session['user_id'], 'update_settings', 'Mise à jour des paramètres')
-            response = jsonify({'success': True, 'message': 'Paramètres mis à jour avec succès'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response
-        except Exception as direct_error:
-            logger.warning(f"Direct update failed, trying individual updates: {str(direct_error)}")
-            # Fall back to individual updates
-            success_count = 0
-            error_items = []
-            
-            for key, value in data.items():
-                try:
-                    db_manager.set_app_settings({key: value})
-                    success_count += 1
-                except Exception as e:
-                    error_items.append(f"{key}: {str(e)}")
-                    logger.error(f"Error setting parameter {key}: {str(e)}")
-            
-            if error_items:
-                if success_count > 0:
-                    message = f"Certains paramètres ont été mis à jour ({success_count}/{len(data)})"
-                    logger.warning(f"{message}. Errors: {', '.join(error_items)}")
-                    response = jsonify({'success': True, 'message': message, 'partial': True, 'errors': error_items})
-                else:
-                    message = "Aucun paramètre n'a pu être mis à jour"
-                    logger.error(f"{message}. Errors: {', '.join(error_items)}")
-                    response = jsonify({'success': False, 'message': message, 'errors': error_items})
-                    response.headers.add('Access-Control-Allow-Origin', '*')
-                    return response, 500
-            
+        # All settings are written in one transaction; failures are reported per key
+        result = db_manager.set_app_settings(data)
+        if not result.get('success'):
+            message = "Aucun paramètre n'a pu être mis à jour"
+            logger.error("%s: %s", message, result.get('error'))
+            return _err(message, 500, error=result.get('error'))
+
+        failed_keys = result.get('failed_keys') or []
+        if failed_keys:
+            message = f"Certains paramètres ont été mis à jour ({len(data) - len(failed_keys)}/{len(data)})"
+            logger.warning("%s. Failed keys: %s", message, ', '.join(failed_keys))
             db_manager.log_user_action(session['user_id'], 'update_settings', 'Mise à jour des paramètres (partielle)')
-            response = jsonify({'success': True, 'message': 'Paramètres mis à jour avec succès'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
+            response = ojsonify({'success': True, 'message': message, 'partial': True, 'errors': failed_keys})
             return response
+
+        db_manager.log_user_action(session['user_id'], 'update_settings', 'Mise à jour des paramètres')
+        response = ojsonify({'success': True, 'message': 'Paramètres mis à jour avec succès'})
+        return response
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error updating app settings: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': 'Erreur lors de la mise à jour des paramètres', 'error': error_msg})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.exception("Error updating app settings: %s", error_msg)
+        return _err('Erreur lors de la mise à jour des paramètres', 500, error=error_msg)
+
+
+# Keys accepted by POST /settings/security
+_ALLOWED_SECURITY_KEYS = frozenset({
+    'session_timeout_minutes',
+    'max_login_attempts',
+    'audit_log_enabled',
+    'email_notifications',
+    'currency',
+})
 
 
 @admin_bp.route('/settings/security', methods=['POST', 'OPTIONS'])
@@ -334,164 +585,138 @@ def app_settings_security():
     """Update security-related settings: session timeout, max login attempts, audit log, notifications, currency.
     This complements the general /settings endpoint and ensures keys are persisted.
     """
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'POST,OPTIONS')
-        return response
-
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-
     try:
         data = request.get_json(silent=True) or {}
         # Only keep recognized keys; values are stored in app_settings
-        allowed_keys = {
-            'session_timeout_minutes',
-            'max_login_attempts',
-            'audit_log_enabled',
-            'email_notifications',
-            'currency'
-        }
-        payload = {k: data[k] for k in data.keys() if k in allowed_keys}
+        payload = {k: v for k, v in data.items() if k in _ALLOWED_SECURITY_KEYS}
         if not payload:
-            response = jsonify({'success': False, 'message': 'Aucune donnée valide fournie'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 400
+            return _err('Aucune donnée valide fournie', 400)
 
         db_manager.set_app_settings(payload)
         db_manager.log_user_action(session['user_id'], 'update_security_settings', 'Mise à jour des paramètres de sécurité')
-        response = jsonify({'success': True, 'message': 'Paramètres de sécurité mis à jour'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        response = ojsonify({'success': True, 'message': 'Paramètres de sécurité mis à jour'})
         return response
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error updating security settings: {error_msg}")
-        response = jsonify({'success': False, 'message': error_msg})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        return _err(error_msg, 500)
 
 
 @admin_bp.route('/backups', methods=['GET', 'POST', 'OPTIONS'])
 def backups_list_create():
-    # Handle CORS preflight request
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
-        return response
-        
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-
     if request.method == 'POST':
         try:
             logger.debug("Creating backup...")
-            export = sync_manager.export_offline_data()
-            if not export.get('success'):
-                logger.error(f"Export error: {export.get('error')}")
-                response = jsonify({'success': False, 'message': export.get('error', 'Erreur export')})
-                response.headers.add('Access-Control-Allow-Origin', '*')
-                return response, 500
-            
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            path = os.path.join(BACKUP_DIR, f'backup_{timestamp}.json')
-            logger.debug(f"Saving backup to: {path}")
+            backup_id = f'backup_{timestamp}.json'
+            path = os.path.join(BACKUP_DIR, backup_id)
+            logger.debug("Saving backup to: %s", path)
             
             # Make sure the directory exists
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            
-            with open(path, 'w') as f:
-                json.dump(export['data'], f, ensure_ascii=False, indent=2)
+            _ensure_backup_dir()
             
-            db_manager.log_user_action(session['user_id'], 'create_backup', f'Backup {path}')
-            response = jsonify({'success': True, 'message': 'Sauvegarde créée avec succès'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response
+            job_id = backup_id[:-len('.json')]
+            _set_backup_job(job_id, status='pending', backup_id=backup_id, error=None)
+            _BACKUP_EXECUTOR.submit(_write_backup, job_id, path, session['user_id'])
+            response = ojsonify({'success': True, 'message': 'Sauvegarde en cours de création',
+                                'job_id': job_id, 'backup_id': backup_id})
+            return response, 202
         except Exception as e:
             error_msg = str(e)
-            stack_trace = traceback.format_exc()
-            logger.error(f"Error creating backup: {error_msg}\n{stack_trace}")
-            response = jsonify({'success': False, 'message': f'Erreur lors de la création de la sauvegarde: {error_msg}'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 500
+            logger.exception("Error creating backup: %s", error_msg)
+            return _err(f'Erreur lors de la création de la sauvegarde: {error_msg}', 500)
 
     try:
-        logger.debug(f"Listing backups from: {BACKUP_DIR}")
-        backups = []
-        if os.path.exists(BACKUP_DIR):
-            for fname in sorted(os.listdir(BACKUP_DIR)):
-                if fname.endswith('.json'):
-                    fpath = os.path.join(BACKUP_DIR, fname)
-                    stat = os.stat(fpath)
-                    backups.append({
-                        'id': fname,
-                        'date': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d'),
-                        'size': f"{stat.st_size/1024:.1f} KB",
-                        'type': 'Manuel'
-                    })
-            backups.sort(key=lambda b: b['date'], reverse=True)
+        logger.debug("Listing backups from: %s", BACKUP_DIR)
+        backups = _list_backups()
         
-        logger.debug(f"Found {len(backups)} backups")
-        response = jsonify({'success': True, 'backups': backups})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response
+        logger.debug("Found %s backups", len(backups))
+        etag = _make_etag(_backup_list_cache[0], len(backups))
+        return _conditional(etag, lambda: ojsonify({'success': True, 'backups': backups}))
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error listing backups: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': f'Erreur lors de la récupération des sauvegardes: {error_msg}'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.exception("Error listing backups: %s", error_msg)
+        return _err(f'Erreur lors de la récupération des sauvegardes: {error_msg}', 500)
+
+
+@admin_bp.route('/backups/<job_id>/status', methods=['GET'])
+def backup_job_status(job_id):
+    job = _get_backup_job(job_id)
+    if not job:
+        return _err('Tâche introuvable', 404)
+    response = ojsonify({'success': True, 'job_id': job_id, **job})
+    return response
 
 
 @admin_bp.route('/backups/<backup_id>', methods=['GET', 'DELETE', 'OPTIONS'])
 def backup_download_delete(backup_id):
-    # Handle CORS preflight request
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,DELETE,OPTIONS')
-        return response
-    
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-
     path = os.path.join(BACKUP_DIR, backup_id)
-    logger.debug(f"Accessing backup: {path}")
+    logger.debug("Accessing backup: %s", path)
     
-    if not os.path.exists(path):
-        response = jsonify({'success': False, 'message': 'Fichier introuvable'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 404
+    try:
+        # One stat() gives existence and the cache validators for the download
+        stat = os.stat(path)
+    except OSError:
+        return _err('Fichier introuvable', 404)
 
     try:
         if request.method == 'DELETE':
-            logger.debug(f"Deleting backup: {path}")
+            logger.debug("Deleting backup: %s", path)
             os.remove(path)
+            if os.path.exists(path + '.gz'):
+                os.remove(path + '.gz')
             db_manager.log_user_action(session['user_id'], 'delete_backup', backup_id)
-            response = jsonify({'success': True, 'message': 'Sauvegarde supprimée avec succès'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
+            response = ojsonify({'success': True, 'message': 'Sauvegarde supprimée avec succès'})
             return response
 
         # For download, we don't add CORS headers directly since send_file handles the response
-        logger.debug(f"Sending file: {path}")
-        response = send_file(path, as_attachment=True)
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        gz_path = path + '.gz'
+        etag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+        accel_prefix = current_app.config.get('BACKUP_ACCEL_REDIRECT')
+        if accel_prefix:
+            # nginx sends the file itself from an `internal` location aliased to BACKUP_DIR
+            logger.debug("Delegating download to nginx: %s", backup_id)
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{backup_id}"
+            response.headers['Content-Type'] = 'application/json'
+            response.headers['Content-Disposition'] = f'attachment; filename={backup_id}'
+        elif 'gzip' in request.headers.get('Accept-Encoding', '') and os.path.exists(gz_path):
+            logger.debug("Sending pre-compressed file: %s", gz_path)
+            response = send_file(gz_path, mimetype='application/json', as_attachment=True,
+                                 download_name=backup_id, conditional=True,
+                                 last_modified=stat.st_mtime, etag=f'{etag}-gz')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            logger.debug("Sending file: %s", path)
+            response = send_file(path, as_attachment=True, conditional=True,
+                                 last_modified=stat.st_mtime, etag=etag)
+        response.headers['Vary'] = 'Accept-Encoding'
         return response
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error handling backup {backup_id}: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': f'Erreur lors du traitement de la sauvegarde: {error_msg}'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.exception("Error handling backup %s: %s", backup_id, error_msg)
+        return _err(f'Erreur lors du traitement de la sauvegarde: {error_msg}', 500)
+
+
+# Largest decompressed .gz upload accepted by the restore (the compressed body is
+# already capped by MAX_CONTENT_LENGTH, but gzip can expand it a thousandfold)
+_MAX_RESTORE_BYTES = 64 * 1024 * 1024
+
+
+def _gunzip_limited(stream, limit=_MAX_RESTORE_BYTES):
+    """Decompress a gzip stream chunk by chunk into a temp file; None once it exceeds limit"""
+    with gzip.GzipFile(fileobj=stream) as gz, tempfile.SpooledTemporaryFile(max_size=1 << 20) as out:
+        total = 0
+        while True:
+            chunk = gz.read(1 << 16)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > limit:
+                return None
+            out.write(chunk)
+        out.seek(0)
+        return out.read()
 
 
 @admin_bp.route('/backups/restore', methods=['POST', 'OPTIONS'])
@@ -500,33 +725,30 @@ def backup_restore():
     Accepts either multipart/form-data with a file field named 'file' or JSON body with 'data'.
     Restores app settings and users minimally and logs the restore operation.
     """
-    # Handle CORS preflight request
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'POST,OPTIONS')
-        return response
-
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-
     try:
         payload = None
         if 'file' in request.files:
             f = request.files['file']
-            content = f.read().decode('utf-8')
-            payload = json.loads(content)
+            # Accept the downloaded .gz as well as plain JSON
+            if f.stream.read(2) == b'\x1f\x8b':
+                f.stream.seek(0)
+                content = _gunzip_limited(f.stream)
+                if content is None:
+                    return _err('Fichier de sauvegarde trop volumineux une fois décompressé', 413)
+            else:
+                f.stream.seek(0)
+                content = f.stream.read()
+            payload = _loads(content)
         else:
-            payload = request.get_json(silent=True) or {}
-            if 'data' in payload and isinstance(payload['data'], dict):
+            try:
+                payload = _loads(request.get_data()) or {}
+            except ValueError:
+                payload = {}
+            if isinstance(payload, dict) and 'data' in payload and isinstance(payload['data'], dict):
                 payload = payload['data']
 
         if not payload:
-            response = jsonify({'success': False, 'message': 'Aucune donnée de sauvegarde fournie'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 400
+            return _err('Aucune donnée de sauvegarde fournie', 400)
 
         restored = {'settings': False, 'users': 0}
 
@@ -542,215 +764,127 @@ def backup_restore():
         # Restore users (non-destructive upsert by username)
         users = payload.get('users')
         if isinstance(users, list):
-            for u in users:
-                try:
-                    if not isinstance(u, dict) or 'username' not in u:
-                        continue
-                    result = db_manager.upsert_user_by_username(u)
-                    if result.get('success'):
-                        restored['users'] += 1
-                except Exception as e:
-                    logger.warning(f"Skipping user restore for {u}: {e}")
+            result = db_manager.upsert_users_bulk(users)
+            if result.get('success'):
+                restored['users'] = result['created'] + result['updated']
+            else:
+                logger.warning(f"Failed to restore users: {result.get('error')}")
 
         db_manager.log_user_action(session['user_id'], 'restore_backup', 'Restauration des données depuis sauvegarde')
-        response = jsonify({'success': True, 'message': 'Restauration terminée', 'restored': restored})
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        response = ojsonify({'success': True, 'message': 'Restauration terminée', 'restored': restored})
         return response
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error restoring backup: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': f'Erreur lors de la restauration: {error_msg}'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.exception("Error restoring backup: %s", error_msg)
+        return _err(f'Erreur lors de la restauration: {error_msg}', 500)
 
 
 @admin_bp.route('/users', methods=['GET', 'POST', 'OPTIONS'])
 def admin_users():
     """List all users or create a new user"""
-    # Handle CORS preflight request
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
-        return response
-    
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-        
     if request.method == 'GET':
         try:
             logger.debug("Getting users list")
             users = db_manager.get_users()
-            logger.debug(f"Retrieved {len(users)} users")
-            response = jsonify({'success': True, 'users': users})
-            response.headers.add('Access-Control-Allow-Origin', '*')
+            logger.debug("Retrieved %s users", len(users))
+            response = ojsonify({'success': True, 'users': users})
             return response
         except Exception as e:
             error_msg = str(e)
-            stack_trace = traceback.format_exc()
-            logger.error(f"Error getting users: {error_msg}\n{stack_trace}")
-            response = jsonify({'success': False, 'message': 'Erreur lors de la récupération des utilisateurs'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 500
+            logger.exception("Error getting users: %s", error_msg)
+            return _err('Erreur lors de la récupération des utilisateurs', 500)
     
     # POST - Create new user
     try:
-        # Dump raw request data for debugging
-        raw_data = request.data.decode('utf-8') if request.data else None
-        logger.debug(f"Raw request data: {raw_data}")
+        data = _parse_body()
         
-        # Try different ways to get the data
-        if request.is_json:
-            data = request.get_json(silent=True) or {}
-        else:
-            try:
-                data = json.loads(raw_data) if raw_data else {}
-            except Exception:
-                data = request.form.to_dict() or {}
-        
-        logger.debug(f"Processing user creation with data: {data}")
+        logger.debug("Processing user creation with data: %s", data)
         
         required_fields = ['username', 'pin']
         if not all(field in data for field in required_fields):
-            response = jsonify({'success': False, 'message': 'Nom d\'utilisateur et PIN requis'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 400
+            return _err('Nom d\'utilisateur et PIN requis', 400)
             
         # Create user with provided data
         result = db_manager.create_user(data)
-        logger.debug(f"User creation result: {result}")
+        logger.debug("User creation result: %s", result)
         
         if not result.get('success', False):
             error_msg = result.get('error', 'Erreur lors de la création de l\'utilisateur')
-            logger.error(f"User creation error: {error_msg}")
-            response = jsonify({'success': False, 'message': error_msg})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 400
+            logger.error("User creation error: %s", error_msg)
+            return _err(error_msg, 400)
             
         db_manager.log_user_action(session['user_id'], 'create_user', f'Création utilisateur {data["username"]}')
-        response = jsonify({'success': True, 'message': 'Utilisateur créé avec succès', 'user_id': result.get('user_id')})
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        response = ojsonify({'success': True, 'message': 'Utilisateur créé avec succès', 'user_id': result.get('user_id')})
         return response
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error creating user: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': 'Erreur lors de la création de l\'utilisateur', 'error': error_msg})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.exception("Error creating user: %s", error_msg)
+        return _err('Erreur lors de la création de l\'utilisateur', 500, error=error_msg)
 
 
 @admin_bp.route('/users/<int:user_id>', methods=['PUT', 'DELETE', 'OPTIONS'])
 def admin_user_operations(user_id):
     """Update or delete a user"""
-    # Handle CORS preflight request
-    if request.method == 'OPTIONS':
-        response = jsonify({'success': True})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'PUT,DELETE,OPTIONS')
-        return response
-        
-    auth_check = require_admin()
-    if auth_check:
-        return auth_check
-    
+    current_uid = session.get('user_id')
     if request.method == 'PUT':
         try:
-            # Dump raw request data for debugging
-            raw_data = request.data.decode('utf-8') if request.data else None
-            logger.debug(f"Raw request data: {raw_data}")
-            
-            # Try different ways to get the data
-            if request.is_json:
-                data = request.get_json(silent=True) or {}
-            else:
-                try:
-                    data = json.loads(raw_data) if raw_data else {}
-                except Exception:
-                    data = request.form.to_dict() or {}
+            data = _parse_body()
             
             if not data:
-                response = jsonify({'success': False, 'message': 'Aucune donnée fournie'})
-                response.headers.add('Access-Control-Allow-Origin', '*')
-                return response, 400
+                return _err('Aucune donnée fournie', 400)
             
             # Check if trying to modify own role
-            if user_id == session.get('user_id') and 'role' in data and data['role'] != 'admin':
-                response = jsonify({'success': False, 'message': 'Vous ne pouvez pas rétrograder votre propre rôle'})
-                response.headers.add('Access-Control-Allow-Origin', '*')
-                return response, 403
+            new_role = data.get('role')
+            if user_id == current_uid and new_role is not None and new_role != 'admin':
+                return _err('Vous ne pouvez pas rétrograder votre propre rôle', 403)
             
-            logger.debug(f"Updating user {user_id} with data: {data}")
-            result = db_manager.update_user(user_id, data)
-            logger.debug(f"Update result: {result}")
+            logger.debug("Updating user %s with data: %s", user_id, data)
+            result = db_manager.update_user(
+                user_id, data, audit=(current_uid, 'update_user', f'Mise à jour utilisateur ID {user_id}'))
+            logger.debug("Update result: %s", result)
             
             if not result.get('success', False):
                 error_msg = result.get('error', 'Erreur lors de la mise à jour de l\'utilisateur')
-                logger.error(f"User update error: {error_msg}")
-                response = jsonify({'success': False, 'message': error_msg})
-                response.headers.add('Access-Control-Allow-Origin', '*')
-                return response, 400
+                logger.error("User update error: %s", error_msg)
+                return _err(error_msg, 400)
                 
-            db_manager.log_user_action(session['user_id'], 'update_user', f'Mise à jour utilisateur ID {user_id}')
-            response = jsonify({'success': True, 'message': 'Utilisateur mis à jour avec succès'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
+            response = ojsonify({'success': True, 'message': 'Utilisateur mis à jour avec succès'})
             return response
         except Exception as e:
             error_msg = str(e)
-            stack_trace = traceback.format_exc()
-            logger.error(f"Error updating user: {error_msg}\n{stack_trace}")
-            response = jsonify({'success': False, 'message': 'Erreur lors de la mise à jour de l\'utilisateur', 'error': error_msg})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 500
+            logger.exception("Error updating user: %s", error_msg)
+            return _err('Erreur lors de la mise à jour de l\'utilisateur', 500, error=error_msg)
     
     # DELETE
     try:
         # Prevent self-deletion
-        if user_id == session.get('user_id'):
-            response = jsonify({'success': False, 'message': 'Vous ne pouvez pas supprimer votre propre compte'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 403
+        if user_id == current_uid:
+            return _err('Vous ne pouvez pas supprimer votre propre compte', 403)
         
-        logger.debug(f"Deleting user {user_id}")
-        result = db_manager.delete_user(user_id)
-        logger.debug(f"Delete result: {result}")
+        logger.debug("Deleting user %s", user_id)
+        result = db_manager.delete_user(
+            user_id, audit=(current_uid, 'delete_user', f'Suppression utilisateur ID {user_id}'))
+        logger.debug("Delete result: %s", result)
         
         if not result.get('success', False):
             error_msg = result.get('error', 'Erreur lors de la suppression de l\'utilisateur')
-            logger.error(f"User delete error: {error_msg}")
-            response = jsonify({'success': False, 'message': error_msg})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 400
+            logger.error("User delete error: %s", error_msg)
+            return _err(error_msg, 400)
             
-        db_manager.log_user_action(session['user_id'], 'delete_user', f'Suppression utilisateur ID {user_id}')
-        response = jsonify({'success': True, 'message': 'Utilisateur supprimé avec succès'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        response = ojsonify({'success': True, 'message': 'Utilisateur supprimé avec succès'})
         return response
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error deleting user: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': 'Erreur lors de la suppression de l\'utilisateur', 'error': error_msg})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.exception("Error deleting user: %s", error_msg)
+        return _err('Erreur lors de la suppression de l\'utilisateur', 500, error=error_msg)
 
 
 @admin_bp.route('/debug', methods=['GET'])
 def admin_debug():
     """Debug endpoint for admin API"""
     try:
-        # Restrict to admins only
-        if session.get('user_role') != 'admin':
-            response = jsonify({'success': False, 'message': 'Accès administrateur requis'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 403
-
         # Check session status
-        session_data = {k: v for k, v in session.items()} if session else {}
+        session_data = dict(session)
 
         # Check database connectivity
         db_status = "OK"
@@ -760,27 +894,29 @@ def admin_debug():
         error = None
 
         try:
-            conn = db_manager.get_connection()
-            cursor = conn.cursor()
+            # One connection and one read transaction: tables, settings and users form a single snapshot
+            with db_manager.acquire() as conn:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    cursor.execute("BEGIN")
 
-            # Get list of tables
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [row[0] for row in cursor.fetchall()]
+                # Get list of tables
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                tables = [row[0] for row in cursor.fetchall()]
 
-            # Check settings
-            try:
-                settings = db_manager.get_app_settings()
-            except Exception as inner_e:
-                settings = {"error": str(inner_e)}
+                # Check settings
+                try:
+                    settings = db_manager.get_app_settings_with(conn)
+                except Exception as inner_e:
+                    settings = {"error": str(inner_e)}
 
-            # Check users
-            try:
-                users_raw = db_manager.get_users()
-                users = [{"id": u["id"], "username": u["username"], "role": u["role"]} for u in users_raw]
-            except Exception as inner_e:
-                users = {"error": str(inner_e)}
+                # Check users
+                try:
+                    users = db_manager.get_users_minimal_with(conn)
+                except Exception as inner_e:
+                    users = {"error": str(inner_e)}
 
-            conn.close()
+                conn.commit()
         except Exception as db_e:
             db_status = f"ERROR: {str(db_e)}"
             error = str(db_e)
@@ -794,16 +930,11 @@ def admin_debug():
         try:
             backup_dir_exists = os.path.exists(BACKUP_DIR)
             if backup_dir_exists:
-                test_file = os.path.join(BACKUP_DIR, "test_write.tmp")
-                try:
-                    with open(test_file, 'w') as f:
-                        f.write("test")
-                    backup_dir_writable = True
-                    os.remove(test_file)
-                except Exception:
-                    backup_dir_writable = False
-
-                backups = [f for f in os.listdir(BACKUP_DIR) if f.endswith('.json')]
+                # Permission-bit check only (ignores Windows ACLs / read-only mounts): good enough for diagnostics
+                backup_dir_writable = os.access(BACKUP_DIR, os.W_OK)
+
+                with os.scandir(BACKUP_DIR) as entries:
+                    backups = [entry.name for entry in entries if entry.name.endswith('.json')]
         except Exception as fs_e:
             fs_status = f"ERROR: {str(fs_e)}"
 
@@ -828,150 +959,159 @@ def admin_debug():
             "working_directory": os.getcwd(),
         }
 
-        response = jsonify({'success': True, 'debug': debug_data})
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        response = ojsonify({'success': True, 'debug': debug_data})
         return response
     except Exception as e:
         error_msg = str(e)
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error in debug endpoint: {error_msg}\n{stack_trace}")
-        response = jsonify({'success': False, 'message': f'Error in debug endpoint: {error_msg}'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
+        logger.exception("Error in debug endpoint: %s", error_msg)
+        response = ojsonify({'success': False, 'message': f'Error in debug endpoint: {error_msg}'})
         return response
 
+# Upper bound on the number of log files listed by admin_logs
+_MAX_LOG_FILES = 50
+
+
+def _tail_lines(path, count, window=65536):
+    """Last count lines of a text file, reading only its tail (the window is doubled once if short)"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        for _ in range(2):
+            start = max(0, size - window)
+            f.seek(start)
+            lines = f.read().decode('utf-8', 'replace').splitlines()
+            if start:
+                lines = lines[1:]  # Most likely a partial line
+            if len(lines) >= count or not start:
+                break
+            window *= 2
+    return [line.strip() for line in lines[-count:]]
+
+
 @admin_bp.route('/logs', methods=['GET', 'OPTIONS'])
 def admin_logs():
     """Get application logs"""
-    if request.method == 'OPTIONS':
-        response = make_response()
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,OPTIONS')
-        return response
-    
     try:
-        # Check authentication
-        # Require admin
-        if session.get('user_role') != 'admin':
-            response = jsonify({'success': False, 'message': 'Accès administrateur requis'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 403
-        
-        # Get logs from the logs directory
-        logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+        # ?meta=0 lists names only and skips the per-file stat
+        with_meta = request.args.get('meta', '1') == '1'
         log_files = []
         
-        if os.path.exists(logs_dir):
-            for file_name in os.listdir(logs_dir):
-                if file_name.endswith('.log'):
-                    file_path = os.path.join(logs_dir, file_name)
-                    try:
-                        stat = os.stat(file_path)
-                        log_files.append({
-                            'name': file_name,
-                            'size': stat.st_size,
-                            'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                            'created': datetime.fromtimestamp(stat.st_ctime).isoformat()
-                        })
-                    except Exception as e:
-                        logger.warning(f"Error reading log file {file_name}: {e}")
+        if os.path.exists(LOGS_DIR):
+            with os.scandir(LOGS_DIR) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.log'):
+                        if not with_meta:
+                            log_files.append((0, {'name': entry.name}))
+                            continue
+                        try:
+                            stat = entry.stat()
+                            log_files.append((stat.st_mtime, {
+                                'name': entry.name,
+                                'size': stat.st_size,
+                                # Epoch seconds; the client formats them in its own timezone
+                                'modified': stat.st_mtime,
+                                'created': stat.st_ctime
+                            }))
+                        except Exception as e:
+                            logger.warning("Error reading log file %s: %s", entry.name, e)
+        
+        # Most recent first (by name without metadata), capped
+        log_files.sort(key=lambda item: (item[0], item[1]['name']), reverse=True)
+        log_files = [info for _, info in log_files[:_MAX_LOG_FILES]]
         
         # Get recent log entries (last 100 lines from app.log if it exists)
         recent_logs = []
-        app_log_path = os.path.join(logs_dir, 'app.log')
-        if os.path.exists(app_log_path):
+        if os.path.exists(APP_LOG_PATH):
             try:
-                with open(app_log_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                    recent_logs = [line.strip() for line in lines[-100:]]  # Last 100 lines
+                recent_logs = _tail_lines(APP_LOG_PATH, 100)
             except Exception as e:
-                logger.warning(f"Error reading app.log: {e}")
+                logger.warning("Error reading app.log: %s", e, exc_info=True)
         
-        response = jsonify({
+        response = ojsonify({
             'success': True,
             'logs': {
                 'files': log_files,
                 'recent': recent_logs,
-                'logs_dir': logs_dir
+                'logs_dir': LOGS_DIR
             }
         })
-        response.headers.add('Access-Control-Allow-Origin', '*')
         return response
         
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"Error fetching logs: {error_msg}")
-        response = jsonify({'success': False, 'message': f'Error fetching logs: {error_msg}'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.error("Error fetching logs: %s", error_msg, exc_info=True)
+        return _err(f'Error fetching logs: {error_msg}', 500)
+
+@admin_bp.route('/pool-health', methods=['GET'])
+def admin_pool_health():
+    """Report connection pool usage for the admin database"""
+    response = ojsonify({'success': True, 'pool': db_manager.pool_stats()})
+    return response
+
+
+def _flask_version():
+    # flask.__version__ is deprecated; read the installed distribution's metadata instead
+    try:
+        return metadata.version('flask')
+    except Exception:
+        return 'Unknown'
+
+
+# Fields of the system-info report that cannot change while the process runs
+_STATIC_PLATFORM = {
+    'system': platform.system(),
+    'release': platform.release(),
+    'version': platform.version(),
+    'machine': platform.machine(),
+    'processor': platform.processor(),
+    'python_version': platform.python_version()
+}
+_STATIC_APP = {
+    'python_executable': sys.executable,
+    'flask_version': _flask_version()
+}
+_DISK_ROOT = 'C:' if _STATIC_PLATFORM['system'] == 'Windows' else '/'
+
 
 @admin_bp.route('/system-info', methods=['GET', 'OPTIONS'])
 def admin_system_info():
     """Get system information"""
-    if request.method == 'OPTIONS':
-        response = make_response()
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,OPTIONS')
-        return response
-    
     try:
-        # Check authentication
-        if session.get('user_role') != 'admin':
-            response = jsonify({'success': False, 'message': 'Accès administrateur requis'})
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            return response, 403
-        
-        # Determine disk root
-        disk_root = 'C:' if platform.system() == 'Windows' else '/'
-
         # Get system information with psutil when available; otherwise use limited info
+        psutil = _psutil()
         if psutil is not None:
+            vm = psutil.virtual_memory()
+            du = psutil.disk_usage(_DISK_ROOT)
             system_info = {
-                'platform': {
-                    'system': platform.system(),
-                    'release': platform.release(),
-                    'version': platform.version(),
-                    'machine': platform.machine(),
-                    'processor': platform.processor(),
-                    'python_version': platform.python_version()
-                },
+                'platform': _STATIC_PLATFORM,
                 'cpu': {
                     'cores': psutil.cpu_count(),
                     'cores_logical': psutil.cpu_count(logical=True),
-                    'usage_percent': psutil.cpu_percent(interval=1)
+                    # Usage since the previous call (non-blocking; the first sample is taken at import)
+                    'usage_percent': psutil.cpu_percent(interval=None)
                 },
                 'memory': {
-                    'total': psutil.virtual_memory().total,
-                    'available': psutil.virtual_memory().available,
-                    'used': psutil.virtual_memory().used,
-                    'percent': psutil.virtual_memory().percent
+                    'total': vm.total,
+                    'available': vm.available,
+                    'used': vm.used,
+                    'percent': vm.percent
                 },
                 'disk': {
-                    'total': psutil.disk_usage(disk_root).total,
-                    'used': psutil.disk_usage(disk_root).used,
-                    'free': psutil.disk_usage(disk_root).free,
-                    'percent': psutil.disk_usage(disk_root).percent
+                    'total': du.total,
+                    'used': du.used,
+                    'free': du.free,
+                    'percent': du.percent
                 },
                 'app': {
                     'working_directory': os.getcwd(),
                     'database_path': getattr(db_manager, 'db_path', 'Unknown'),
-                    'python_executable': sys.executable,
-                    'flask_version': getattr(flask, '__version__', 'Unknown')
+                    **_STATIC_APP
                 }
             }
         else:
             # Fallback system info without psutil
-            du = shutil.disk_usage(disk_root)
+            du = shutil.disk_usage(_DISK_ROOT)
             system_info = {
-                'platform': {
-                    'system': platform.system(),
-                    'release': platform.release(),
-                    'version': platform.version(),
-                    'machine': platform.machine(),
-                    'processor': platform.processor(),
-                    'python_version': platform.python_version()
-                },
+                'platform': _STATIC_PLATFORM,
                 'disk': {
                     'total': du.total,
                     'used': du.used,
@@ -980,23 +1120,19 @@ def admin_system_info():
                 'app': {
                     'working_directory': os.getcwd(),
                     'database_path': getattr(db_manager, 'db_path', 'Unknown'),
-                    'python_executable': sys.executable,
-                    'flask_version': getattr(flask, '__version__', 'Unknown')
+                    **_STATIC_APP
                 },
                 'note': 'Limited system info available (psutil not installed)'
             }
         
-        response = jsonify({
+        response = ojsonify({
             'success': True,
             'system_info': system_info
         })
-        response.headers.add('Access-Control-Allow-Origin', '*')
         return response
         
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"Error fetching system info: {error_msg}")
-        response = jsonify({'success': False, 'message': f'Error fetching system info: {error_msg}'})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        logger.error("Error fetching system info: %s", error_msg, exc_info=True)
+        return _err(f'Error fetching system info: {error_msg}', 500)
 
@@ -5,12 +5,38 @@ AI Insights API Blueprint
 Handles AI predictions, forecasting, and smart recommendations
 """
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, g
 from db.database import DatabaseManager
+from .json_utils import ojsonify
 from models.ml_forecasting import StockPredictor, SalesForecaster
+import atexit
+import hashlib
+import heapq
 import logging
-from datetime import datetime, date, timedelta
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, date, timedelta, timezone
+from functools import wraps
 import json
+import numpy as np
+
+# Optional dependency: Flask-Caching (response cache for the read-only AI endpoints)
+try:
+    from flask_caching import Cache  # type: ignore
+except Exception:  # pragma: no cover - optional dep may be absent
+    Cache = None  # Endpoints are computed on every request
+
+# Optional dependency: orjson (faster JSON for stored predictions)
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional dep may be absent
+    orjson = None  # Fallback to json.dumps
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +47,225 @@ db_manager = DatabaseManager()
 stock_predictor = StockPredictor()
 sales_forecaster = SalesForecaster()
 
+# Response cache shared by all workers: Redis when AI_CACHE_REDIS_URL/REDIS_URL is set,
+# otherwise files in a per-database temp directory (AI_CACHE_DIR overrides it), so a
+# write handled by one gunicorn worker clears the entries the others serve.
+# Cleared after successful writes to the blueprints that feed the AI inputs.
+_CACHE_TIMEOUT_ANALYSIS = 12 * 3600
+_CACHE_TIMEOUT_ALERTS = 3600
+_redis_url = os.environ.get('AI_CACHE_REDIS_URL') or os.environ.get('REDIS_URL')
+_cache_dir = os.environ.get('AI_CACHE_DIR') or os.path.join(
+    tempfile.gettempdir(),
+    'quincaillerie-ai-cache-' + hashlib.blake2b(db_manager.db_path.encode('utf-8'), digest_size=6).hexdigest(),
+)
+_cache = None
+if Cache is not None:
+    _cache = Cache(config={
+        'CACHE_TYPE': os.environ.get('AI_CACHE_TYPE') or ('RedisCache' if _redis_url else 'FileSystemCache'),
+        'CACHE_REDIS_URL': _redis_url,
+        'CACHE_DIR': _cache_dir,
+        'CACHE_KEY_PREFIX': 'ai:',
+    })
+
+# Writes that change sales, stock, finances or settings (sync_pull imports offline
+# sales; admin restores backups and edits settings). Logins, notifications... don't.
+_AI_INPUT_BLUEPRINTS = frozenset({'sales', 'inventory', 'finance', 'settings', 'admin'})
+_AI_INPUT_ENDPOINTS = frozenset({'sync_pull'})
+
+
+@ai_bp.record_once
+def _init_cache(state):
+    if _cache is not None:
+        _cache.init_app(state.app)
+
+
+@ai_bp.after_app_request
+def _invalidate_cache(response):
+    """New sales, stock moves, expenses, settings... make every cached AI result stale"""
+    if (_cache is not None and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and response.status_code < 400
+            and (request.blueprint in _AI_INPUT_BLUEPRINTS or request.endpoint in _AI_INPUT_ENDPOINTS)):
+        try:
+            _cache.clear()
+        except Exception as e:
+            logger.warning("Could not clear AI response cache: %s", e)
+    return response
+
+
+def cached_response(timeout):
+    """Cache a view's successful JSON body per user and query string"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if _cache is None or 'user_id' not in session:
+                return view(*args, **kwargs)
+            key = f"{request.path}:{session['user_id']}:{request.query_string.decode()}"
+            try:
+                body = _cache.get(key)
+            except Exception as e:
+                logger.warning("AI response cache unavailable: %s", e)
+                return view(*args, **kwargs)
+            if body is not None:
+                return Response(body, mimetype='application/json')
+            response = view(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                try:
+                    _cache.set(key, response.get_data(), timeout=timeout)
+                except Exception as e:
+                    logger.warning("Could not store AI response: %s", e)
+            return response
+        return wrapper
+    return decorator
+
+# Statement text shared by the endpoints that cache predictions; identical strings let
+# the pooled connections' statement cache reuse the prepared statements
+_INSERT_PREDICTION_SQL = '''
+    INSERT OR REPLACE INTO ai_predictions
+    (prediction_type, product_id, prediction_data, confidence_score,
+     prediction_date, expires_at, data_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+_CURRENT_PREDICTION_HASHES_SQL = '''
+    SELECT product_id, data_hash FROM ai_predictions
+    WHERE prediction_type = ? AND data_hash IS NOT NULL AND expires_at > ?
+'''
+_DELETE_STALE_PREDICTIONS_SQL = '''
+    DELETE FROM ai_predictions
+    WHERE prediction_type = ? AND created_at < ?
+'''
+
+
+def _utc_cutoff(days, fmt='%Y-%m-%d'):
+    """Same value as SQLite's DATE('now', '-<days> days') (UTC), computed once and bound
+    as a parameter so the statement text stays constant and the column compares directly"""
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime(fmt)
+
+# Rows only expire after a day, so the stale-row DELETE runs at most once an hour per type
+_CLEANUP_INTERVAL = 3600
+_last_cleanup = {}
+_cleanup_lock = threading.Lock()
+
+
+def _cleanup_due(prediction_type):
+    """True (and the clock restarted) when prediction_type's stale rows should be purged"""
+    now = time.monotonic()
+    with _cleanup_lock:
+        last = _last_cleanup.get(prediction_type)
+        if last is not None and now - last < _CLEANUP_INTERVAL:
+            return False
+        _last_cleanup[prediction_type] = now
+        return True
+
+# Audit entries for AI requests are written by one background thread, in batches,
+# so the request doesn't wait for the INSERT/commit
+_LOG_BATCH_MAX = 500
+_log_queue = queue.Queue()
+_log_thread = None
+_log_thread_lock = threading.Lock()
+
+
+def _drain_log_queue(block):
+    items = [_log_queue.get()] if block else []
+    while len(items) < _LOG_BATCH_MAX:
+        try:
+            items.append(_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+def _write_log_batch(items):
+    if not items:
+        return
+    try:
+        if not db_manager.is_audit_enabled():
+            return
+    except Exception:
+        # If we fail to determine, proceed with logging to be safe
+        pass
+    try:
+        with db_manager.acquire() as conn:
+            conn.executemany(
+                'INSERT INTO user_activity_log (user_id, action_type, description) VALUES (?, ?, ?)',
+                items,
+            )
+            conn.commit()
+    except Exception as e:
+        logger.error("Error logging %d user actions: %s", len(items), e)
+
+
+def _log_writer():
+    while True:
+        _write_log_batch(_drain_log_queue(block=True))
+
+
+def log_action_async(user_id, action_type, description):
+    """Queue a user_activity_log entry; the writer thread is started on first use"""
+    global _log_thread
+    if _log_thread is None:
+        with _log_thread_lock:
+            if _log_thread is None:
+                _log_thread = threading.Thread(target=_log_writer, name='ai-audit-log', daemon=True)
+                _log_thread.start()
+    _log_queue.put((user_id, action_type, description))
+
+
+@atexit.register
+def _flush_log_queue():
+    """Write whatever is still queued when the process exits"""
+    while True:
+        items = _drain_log_queue(block=False)
+        if not items:
+            break
+        _write_log_batch(items)
+
+# Model calls run on a small shared pool (each opens its own connection, so they are
+# thread-safe): requests wait at most _MODEL_TIMEOUT and can overlap other work with them
+_MODEL_TIMEOUT = 30
+_model_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ai-model')
+
+
+def _run_model(fn, *args):
+    return _model_executor.submit(fn, *args).result(timeout=_MODEL_TIMEOUT)
+
+
+# numpy scalars/arrays may come straight out of the models
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def _dumps(obj):
+    """JSON text for the ai_predictions.prediction_data column (sorted keys, so equal data hashes equal)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS | orjson.OPT_SORT_KEYS).decode('utf-8')
+    return json.dumps(obj, sort_keys=True)
+
+
+def _store_predictions(cursor, prediction_type, entries, default_confidence, expires):
+    """Insert (product_id, data) entries, skipping those whose data an unexpired row already holds.
+    Returns the number of rows written."""
+    cursor.execute(_CURRENT_PREDICTION_HASHES_SQL, (prediction_type, datetime.now().isoformat()))
+    current = {(row[0], row[1]) for row in cursor}
+    today = date.today().isoformat()
+    rows = []
+    for product_id, data in entries:
+        payload = _dumps(data)
+        digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+        if (product_id, digest) not in current:
+            rows.append((prediction_type, product_id, payload, data.get('confidence', default_confidence),
+                         today, expires, digest))
+    cursor.executemany(_INSERT_PREDICTION_SQL, rows)
+    return len(rows)
+
+
+def _currency():
+    """Store currency from the settings, read once per request"""
+    if '_ai_currency' not in g:
+        try:
+            g._ai_currency = db_manager.get_app_settings().get('currency') or 'MRU'
+        except Exception:
+            g._ai_currency = 'MRU'
+    return g._ai_currency
+
 def require_auth():
     """Check if user is authenticated"""
     if 'user_id' not in session:
@@ -28,6 +273,7 @@ def require_auth():
     return None
 
 @ai_bp.route('/stock-predictions', methods=['GET'])
+@cached_response(_CACHE_TIMEOUT_ANALYSIS)
 def get_stock_predictions():
     """Get stock predictions and alerts"""
     auth_check = require_auth()
@@ -37,49 +283,38 @@ def get_stock_predictions():
     conn = None
     try:
         # Get products with potential stock issues
-        predictions = stock_predictor.predict_stock_alerts()
+        predictions = _run_model(stock_predictor.predict_stock_alerts)
 
         # Store predictions in cache
         conn = db_manager.get_connection()
         cursor = conn.cursor()
 
         # Clear old predictions
-        cursor.execute('''
-            DELETE FROM ai_predictions 
-            WHERE prediction_type = 'stock_out' AND created_at < datetime('now', '-1 day')
-        ''')
+        if _cleanup_due('stock_out'):
+            cursor.execute(_DELETE_STALE_PREDICTIONS_SQL, ('stock_out', _utc_cutoff(1, '%Y-%m-%d %H:%M:%S')))
 
-        # Store new predictions
-        for prediction in predictions:
-            cursor.execute('''
-                INSERT OR REPLACE INTO ai_predictions 
-                (prediction_type, product_id, prediction_data, confidence_score, 
-                 prediction_date, expires_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                'stock_out',
-                prediction['product_id'],
-                json.dumps(prediction),
-                prediction.get('confidence', 0.8),
-                date.today().isoformat(),
-                (datetime.now() + timedelta(hours=24)).isoformat()
-            ))
+        # Store new predictions (unchanged ones are not rewritten)
+        expires = (datetime.now() + timedelta(hours=24)).isoformat()
+        _store_predictions(cursor, 'stock_out', [(p['product_id'], p) for p in predictions], 0.8, expires)
 
         conn.commit()
 
         # Log AI prediction request
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_stock_prediction',
             f'Prédictions stock générées: {len(predictions)} produits'
         )
 
-        return jsonify({
+        return ojsonify({
             'success': True,
             'predictions': predictions,
             'generated_at': datetime.now().isoformat()
         })
 
+    except FutureTimeout:
+        logger.error("Timed out generating stock predictions")
+        return jsonify({'success': False, 'message': 'Le calcul a pris trop de temps, réessayez plus tard'}), 504
     except Exception as e:
         logger.error(f"Error generating stock predictions: {e}")
         return jsonify({'success': False, 'message': 'Erreur lors de la génération des prédictions'}), 500
@@ -105,16 +340,16 @@ def get_sales_forecast():
         
         if product_id:
             # Forecast for specific product
-            forecast = sales_forecaster.predict_product_sales(int(product_id), days_ahead)
+            future = _model_executor.submit(sales_forecaster.predict_product_sales, int(product_id), days_ahead)
         else:
             # Overall sales forecast
-            forecast = sales_forecaster.predict_overall_sales(days_ahead)
+            future = _model_executor.submit(sales_forecaster.predict_overall_sales, days_ahead)
+
+        # Settings are read while the model runs
+        _cur = _currency()
+        forecast = future.result(timeout=_MODEL_TIMEOUT)
 
         # Standardize forecast fields for frontend consumption
-        try:
-            _cur = (db_manager.get_app_settings().get('currency') or 'MRU')
-        except Exception:
-            _cur = 'MRU'
         forecast['forecastDays'] = days_ahead
         total_rev = forecast.get('total_predicted_revenue')
         if total_rev is not None:
@@ -129,35 +364,32 @@ def get_sales_forecast():
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO ai_predictions 
-            (prediction_type, product_id, prediction_data, confidence_score, 
-             prediction_date, expires_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+        _store_predictions(
+            cursor,
             'sales_forecast',
-            product_id,
-            json.dumps(forecast),
-            forecast.get('confidence', 0.75),
-            date.today().isoformat(),
+            [(int(product_id) if product_id else None, forecast)],
+            0.75,
             (datetime.now() + timedelta(hours=12)).isoformat()
-        ))
+        )
         
         conn.commit()
         
         # Log AI forecast request
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_sales_forecast',
             f'Prévisions ventes générées pour {days_ahead} jours'
         )
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'forecast': forecast,
             'generated_at': datetime.now().isoformat()
         })
         
+    except FutureTimeout:
+        logger.error("Timed out generating sales forecast")
+        return jsonify({'success': False, 'message': 'Le calcul a pris trop de temps, réessayez plus tard'}), 504
     except Exception as e:
         logger.error(f"Error generating sales forecast: {e}")
         return jsonify({'success': False, 'message': 'Erreur lors de la génération des prévisions'}), 500
@@ -169,6 +401,7 @@ def get_sales_forecast():
             pass
 
 @ai_bp.route('/restock-suggestions', methods=['GET'])
+@cached_response(_CACHE_TIMEOUT_ANALYSIS)
 def get_restock_suggestions():
     """Get AI-powered restocking suggestions"""
     auth_check = require_auth()
@@ -177,49 +410,38 @@ def get_restock_suggestions():
 
     conn = None
     try:
-        suggestions = stock_predictor.generate_restock_suggestions()
+        suggestions = _run_model(stock_predictor.generate_restock_suggestions)
 
         # Store suggestions in cache
         conn = db_manager.get_connection()
         cursor = conn.cursor()
 
         # Clear old suggestions
-        cursor.execute('''
-            DELETE FROM ai_predictions 
-            WHERE prediction_type = 'restock_suggestion' AND created_at < datetime('now', '-1 day')
-        ''')
+        if _cleanup_due('restock_suggestion'):
+            cursor.execute(_DELETE_STALE_PREDICTIONS_SQL, ('restock_suggestion', _utc_cutoff(1, '%Y-%m-%d %H:%M:%S')))
 
-        # Store new suggestions
-        for suggestion in suggestions:
-            cursor.execute('''
-                INSERT OR REPLACE INTO ai_predictions 
-                (prediction_type, product_id, prediction_data, confidence_score, 
-                 prediction_date, expires_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                'restock_suggestion',
-                suggestion['product_id'],
-                json.dumps(suggestion),
-                suggestion.get('confidence', 0.7),
-                date.today().isoformat(),
-                (datetime.now() + timedelta(days=3)).isoformat()
-            ))
+        # Store new suggestions (unchanged ones are not rewritten)
+        expires = (datetime.now() + timedelta(days=3)).isoformat()
+        _store_predictions(cursor, 'restock_suggestion', [(sg['product_id'], sg) for sg in suggestions], 0.7, expires)
 
         conn.commit()
 
         # Log restock suggestions request
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_restock_suggestions',
             f'Suggestions réapprovisionnement: {len(suggestions)} produits'
         )
 
-        return jsonify({
+        return ojsonify({
             'success': True,
             'suggestions': suggestions,
             'generated_at': datetime.now().isoformat()
         })
 
+    except FutureTimeout:
+        logger.error("Timed out generating restock suggestions")
+        return jsonify({'success': False, 'message': 'Le calcul a pris trop de temps, réessayez plus tard'}), 504
     except Exception as e:
         logger.error(f"Error generating restock suggestions: {e}")
         return jsonify({'success': False, 'message': 'Erreur lors de la génération des suggestions'}), 500
@@ -231,6 +453,7 @@ def get_restock_suggestions():
             pass
 
 @ai_bp.route('/capital-efficiency', methods=['GET'])
+@cached_response(_CACHE_TIMEOUT_ANALYSIS)
 def get_capital_efficiency():
     """Calculate capital efficiency score"""
     auth_check = require_auth()
@@ -242,22 +465,32 @@ def get_capital_efficiency():
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Get financial data for efficiency calculation
-        cursor.execute('''
-            SELECT 
-                (SELECT COALESCE(SUM(amount), 0) FROM capital_entries) as total_capital,
-                (SELECT COALESCE(SUM(purchase_price * current_stock), 0) FROM products WHERE is_active = 1) as stock_value,
-                (SELECT COALESCE(SUM(profit_margin), 0) FROM sale_items) as total_profit,
-                (SELECT COALESCE(SUM(total_amount), 0) FROM sales) as total_revenue
-        ''')
-        
-        financial_data = dict(cursor.fetchone())
+        # Get financial data for efficiency calculation: one row kept current by triggers
+        # (see DatabaseManager._ensure_financial_summary), else the live aggregates
+        row = None
+        try:
+            cursor.execute('''
+                SELECT total_capital, stock_value, total_profit, total_revenue
+                FROM financial_summary WHERE id = 1
+            ''')
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            pass
+        if row is None:
+            cursor.execute('''
+                SELECT 
+                    (SELECT COALESCE(SUM(amount), 0) FROM capital_entries) as total_capital,
+                    (SELECT COALESCE(SUM(purchase_price * current_stock), 0) FROM products WHERE is_active = 1) as stock_value,
+                    (SELECT COALESCE(SUM(profit_margin), 0) FROM sale_items) as total_profit,
+                    (SELECT COALESCE(SUM(total_amount), 0) FROM sales) as total_revenue
+            ''')
+            row = cursor.fetchone()
         
         # Calculate various efficiency metrics
-        total_capital = financial_data['total_capital']
-        stock_value = financial_data['stock_value']
-        total_profit = financial_data['total_profit']
-        total_revenue = financial_data['total_revenue']
+        total_capital = row['total_capital']
+        stock_value = row['stock_value']
+        total_profit = row['total_profit']
+        total_revenue = row['total_revenue']
         
         efficiency_metrics = {
             'capital_turnover': (total_revenue / total_capital) if total_capital > 0 else 0,
@@ -314,7 +547,7 @@ def get_capital_efficiency():
         
         # Add detailed analysis
         analysis = {
-            'financial_data': financial_data,
+            'financial_data': dict(row),
             'efficiency_metrics': efficiency_metrics,
             'recommendations': recommendations,
             'score_breakdown': {
@@ -326,13 +559,13 @@ def get_capital_efficiency():
         }
         
         # Log efficiency analysis
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_efficiency_analysis',
             f'Analyse efficacité capital: score {efficiency_metrics["capital_efficiency_score"]:.1f}/100'
         )
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'analysis': analysis,
             'generated_at': datetime.now().isoformat()
@@ -348,7 +581,43 @@ def get_capital_efficiency():
         except Exception:
             pass
 
+def _price_suggestion_kernel(current_price, purchase_price, total_sold, target_margin):
+    """Pricing math over whole product columns (float64 arrays), no per-product Python.
+
+    Returns (suggested_price, current_margin, suggested_margin, price_change, velocity, recommendation).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Calculate current margin
+        current_margin = np.where(current_price > 0, (current_price - purchase_price) / current_price * 100, 0.0)
+
+        # Calculate optimal price for target margin
+        optimal_price = purchase_price / (1 - target_margin / 100)
+
+        # Determine velocity category
+        velocity = np.select([total_sold >= 20, total_sold >= 5], ['high', 'medium'], 'low')
+
+        # Generate recommendation: below 80% of target -> increase (gradual when selling fast,
+        # aggressive when slow); above 120% with low velocity -> decrease to boost sales
+        below = current_margin < target_margin * 0.8
+        above = ~below & (current_margin > target_margin * 1.2) & (velocity == 'low')
+        conditions = [below & (velocity == 'high'), below & (velocity == 'medium'), below, above]
+        suggested_price = np.select(
+            conditions,
+            [np.minimum(optimal_price, current_price * 1.1), np.minimum(optimal_price, current_price * 1.15),
+             optimal_price, np.maximum(optimal_price, current_price * 0.9)],
+            current_price,
+        )
+        recommendation = np.select(
+            conditions,
+            ['increase_gradual', 'increase_moderate', 'increase_aggressive', 'decrease_to_boost_sales'],
+            'maintain',
+        )
+        suggested_margin = np.where(suggested_price != 0, (suggested_price - purchase_price) / suggested_price * 100, 0.0)
+        price_change = np.where(current_price != 0, (suggested_price - current_price) / current_price * 100, 0.0)
+    return suggested_price, current_margin, suggested_margin, price_change, velocity, recommendation
+
 @ai_bp.route('/price-suggestions', methods=['GET'])
+@cached_response(_CACHE_TIMEOUT_ANALYSIS)
 def get_price_suggestions():
     """Get AI-powered pricing suggestions"""
     auth_check = require_auth()
@@ -385,9 +654,6 @@ def get_price_suggestions():
                 ''',
                 (product_id,),
             )
-
-            row = cursor.fetchone()
-            products = [dict(row)] if row else []
         else:
             # Suggestions for all products
             cursor.execute(
@@ -406,93 +672,64 @@ def get_price_suggestions():
                 '''
             )
 
-            products = [dict(row) for row in cursor.fetchall()]
-        
-        suggestions = []
-        
-        for product in products:
-            if not product or product['purchase_price'] is None:
-                continue
-            
-            # Use selling_price (as per DB schema)
-            current_price = product.get('selling_price') or product.get('sale_price') or 0
-            purchase_price = product.get('purchase_price') or 0
-            avg_selling_price = product['avg_selling_price'] or current_price
-            total_sold = product['total_sold'] or 0
-            
-            # Calculate current margin
-            current_margin = ((current_price - purchase_price) / current_price * 100) if current_price > 0 else 0
-            
-            # Calculate optimal price for target margin
-            optimal_price = purchase_price / (1 - target_margin / 100)
-            
-            # Calculate market-based price (based on actual sales)
-            market_price = avg_selling_price if avg_selling_price else current_price
-            
-            # Determine velocity category
-            if total_sold >= 20:
-                velocity = 'high'
-            elif total_sold >= 5:
-                velocity = 'medium'
-            else:
-                velocity = 'low'
-            
-            # Generate recommendation
-            recommendation = 'maintain'  # default
-            suggested_price = current_price
-            
-            if current_margin < target_margin * 0.8:  # Below 80% of target
-                if velocity == 'high':
-                    # High velocity: gradual increase
-                    suggested_price = min(optimal_price, current_price * 1.1)
-                    recommendation = 'increase_gradual'
-                elif velocity == 'medium':
-                    # Medium velocity: moderate increase
-                    suggested_price = min(optimal_price, current_price * 1.15)
-                    recommendation = 'increase_moderate'
-                else:
-                    # Low velocity: can increase more aggressively
-                    suggested_price = optimal_price
-                    recommendation = 'increase_aggressive'
-            
-            elif current_margin > target_margin * 1.2:  # Above 120% of target
-                if velocity == 'low':
-                    # Low velocity with high margin: consider price reduction
-                    suggested_price = max(optimal_price, current_price * 0.9)
-                    recommendation = 'decrease_to_boost_sales'
-            
-            suggestion = {
+        # Shelf price is selling_price, else the legacy sale_price; either column may be absent
+        columns = {d[0] for d in cursor.description}
+        price_columns = [c for c in ('selling_price', 'sale_price') if c in columns]
+
+        def shelf_price(row):
+            for column in price_columns:
+                if row[column]:
+                    return row[column]
+            return 0
+
+        # sqlite3.Row objects are read straight off the cursor (no dict copies),
+        # skipping products without a purchase price
+        products = [row for row in cursor if row['purchase_price'] is not None]
+        
+        # Price math runs column-wise over all products at once
+        n = len(products)
+        current_price = np.fromiter((shelf_price(p) for p in products), np.float64, n)
+        purchase_price = np.fromiter((p['purchase_price'] or 0 for p in products), np.float64, n)
+        total_sold = np.fromiter((p['total_sold'] or 0 for p in products), np.float64, n)
+        
+        (suggested_price, current_margin, suggested_margin, price_change,
+         velocity, recommendation) = _price_suggestion_kernel(current_price, purchase_price, total_sold, target_margin)
+        
+        suggestions = (
+            {
                 'product_id': product['id'],
                 'product_name': product['name'],
-                'current_price': current_price,
-                'purchase_price': purchase_price,
-                'suggested_price': round(suggested_price, 0),  # Rounded to nearest unit
-                'current_margin': round(current_margin, 1),
-                'suggested_margin': round(((suggested_price - purchase_price) / suggested_price * 100), 1),
-                'velocity': velocity,
-                'total_sold': total_sold,
-                'recommendation': recommendation,
-                'price_change_percentage': round(((suggested_price - current_price) / current_price * 100), 1),
-                'confidence': 0.8 if total_sold >= 10 else 0.6
+                'current_price': shelf_price(product),
+                'purchase_price': product['purchase_price'] or 0,
+                'suggested_price': round(float(suggested_price[i]), 0),  # Rounded to nearest unit
+                'current_margin': round(float(current_margin[i]), 1),
+                'suggested_margin': round(float(suggested_margin[i]), 1),
+                'velocity': str(velocity[i]),
+                'total_sold': product['total_sold'] or 0,
+                'recommendation': str(recommendation[i]),
+                'price_change_percentage': round(float(price_change[i]), 1),
+                'confidence': 0.8 if total_sold[i] >= 10 else 0.6
             }
-            
-            suggestions.append(suggestion)
+            for i, product in enumerate(products)
+        )
         
         conn.close()
         
-        # Sort by potential impact (price change * sales volume)
-        suggestions.sort(key=lambda x: abs(x['price_change_percentage']) * x['total_sold'], reverse=True)
+        # Top 20 by potential impact (price change * sales volume), without sorting them all
+        top_suggestions = heapq.nlargest(
+            20, suggestions, key=lambda x: abs(x['price_change_percentage']) * x['total_sold']
+        )
         
         # Log pricing analysis
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_price_suggestions',
-            f'Suggestions prix générées: {len(suggestions)} produits'
+            f'Suggestions prix générées: {len(products)} produits'
         )
         
-        return jsonify({
+        return ojsonify({
             'success': True,
-            'suggestions': suggestions[:20],  # Top 20 suggestions
+            'suggestions': top_suggestions,
             'target_margin': target_margin,
             'generated_at': datetime.now().isoformat()
         })
@@ -507,7 +744,11 @@ def get_price_suggestions():
         except Exception:
             pass
 
+_SEVERITY_RANK = {'critical': 3, 'warning': 2, 'info': 1}
+_MAX_ALERTS = 100
+
 @ai_bp.route('/smart-alerts', methods=['GET'])
+@cached_response(_CACHE_TIMEOUT_ALERTS)
 def get_smart_alerts():
     """Get AI-generated smart alerts and notifications"""
     auth_check = require_auth()
@@ -520,148 +761,156 @@ def get_smart_alerts():
         cursor = conn.cursor()
         
         alerts = []
+        currency = _currency()
         
-        # Low stock alerts with AI severity
+        # All five alert sources in one round-trip; each branch tags its rows with src and
+        # fills the shared columns (name, amount, value, info), ord keeps each branch's order
         cursor.execute('''
-            SELECT p.name, p.current_stock, p.min_stock_alert,
-                   AVG(si.quantity) as avg_daily_sales
-            FROM products p
-            LEFT JOIN sale_items si ON p.id = si.product_id
-            LEFT JOIN sales s ON si.sale_id = s.id AND DATE(s.sale_date) >= DATE('now', '-30 days')
-            WHERE p.is_active = 1 AND p.current_stock <= p.min_stock_alert
-            GROUP BY p.id
-        ''')
-        
-        for row in cursor.fetchall():
-            row = dict(row)
-            avg_sales = row['avg_daily_sales'] or 0
-            days_until_stockout = (row['current_stock'] / avg_sales) if avg_sales > 0 else float('inf')
-            
-            severity = 'critical' if days_until_stockout <= 3 else 'warning' if days_until_stockout <= 7 else 'info'
-            
-            alerts.append({
-                'type': 'low_stock',
-                'severity': severity,
-                'title': f'Stock faible: {row["name"]}',
-                'message': f'Stock actuel: {row["current_stock"]}. Rupture estimée dans {days_until_stockout:.1f} jours.',
-                'product_name': row['name'],
-                'priority': 3 if severity == 'critical' else 2 if severity == 'warning' else 1
-            })
-        
-        # Overdue debts alerts
-        cursor.execute('''
-            SELECT client_name, remaining_amount, due_date,
-                   (julianday('now') - julianday(due_date)) as days_overdue
-            FROM client_debts 
-            WHERE status = 'pending' AND due_date < DATE('now')
-            ORDER BY days_overdue DESC
-        ''')
-        
-        for row in cursor.fetchall():
-            row = dict(row)
-            days_overdue = int(row['days_overdue'])
-            severity = 'critical' if days_overdue > 30 else 'warning' if days_overdue > 7 else 'info'
-            
-            alerts.append({
-                'type': 'overdue_debt',
-                'severity': severity,
-                'title': f'Dette en retard: {row["client_name"]}',
-                # Use current currency from settings
-                'message': (lambda cur: f"Montant: {row['remaining_amount']} {cur}. En retard de {days_overdue} jours.")((db_manager.get_app_settings().get('currency') or 'MRU')),
-                'client_name': row['client_name'],
-                'amount': row['remaining_amount'],
-                'priority': 3 if severity == 'critical' else 2
-            })
-        
-        # Unusual expense patterns
-        cursor.execute('''
-            SELECT DATE(expense_date) as date, SUM(amount) as daily_total
-            FROM expenses
-            WHERE DATE(expense_date) >= DATE('now', '-7 days')
-            GROUP BY DATE(expense_date)
-            HAVING daily_total > (
-                SELECT AVG(daily_amount) * 2
+            SELECT * FROM (
+                -- 1: low stock with AI severity; value = days until stockout (formatted),
+                -- info = severity, both computed here from the average sale quantity
+                SELECT 1 AS src, id AS ord, name, amount,
+                       CASE WHEN avg_sales > 0 THEN printf('%.1f', amount * 1.0 / avg_sales)
+                            ELSE 'inf' END AS value,
+                       CASE WHEN avg_sales > 0 AND amount * 1.0 / avg_sales <= 3 THEN 'critical'
+                            WHEN avg_sales > 0 AND amount * 1.0 / avg_sales <= 7 THEN 'warning'
+                            ELSE 'info' END AS info
                 FROM (
-                    SELECT SUM(amount) as daily_amount
-                    FROM expenses
-                    WHERE DATE(expense_date) >= DATE('now', '-30 days')
-                    GROUP BY DATE(expense_date)
+                    SELECT p.id, p.name, p.current_stock AS amount, AVG(si.quantity) AS avg_sales
+                    FROM products p
+                    LEFT JOIN sale_items si ON p.id = si.product_id
+                    LEFT JOIN sales s ON si.sale_id = s.id AND s.sale_date >= :since_30
+                    WHERE p.is_active = 1 AND p.current_stock <= p.min_stock_alert
+                    GROUP BY p.id
                 )
             )
-        ''')
-        
-        for row in cursor.fetchall():
-            row = dict(row)
-            alerts.append({
-                'type': 'unusual_expense',
-                'severity': 'warning',
-                'title': f'Dépenses élevées détectées',
-                'message': (lambda cur: f"Dépenses du {row['date']}: {row['daily_total']} {cur} (inhabituel)")((db_manager.get_app_settings().get('currency') or 'MRU')),
-                'date': row['date'],
-                'amount': row['daily_total'],
-                'priority': 2
-            })
-        
-        # Missing sales entries (no sales for 2+ days)
-        cursor.execute('''
-            SELECT MAX(DATE(sale_date)) as last_sale_date,
-                   (julianday('now') - julianday(MAX(DATE(sale_date)))) as days_since_last_sale
-            FROM sales
-        ''')
-        
-        result = cursor.fetchone()
-        if result and result[1] and result[1] >= 2:
-            days_since = int(result[1])
-            alerts.append({
-                'type': 'missing_sales',
-                'severity': 'warning' if days_since >= 3 else 'info',
-                'title': 'Aucune vente récente',
-                'message': f'Dernière vente il y a {days_since} jours. Vérifiez les saisies.',
-                'days_since': days_since,
-                'priority': 2 if days_since >= 3 else 1
-            })
-        
-        # High performing products that are low in stock
-        cursor.execute('''
-            SELECT p.name, p.current_stock, SUM(si.quantity) as recent_sales
-            FROM products p
-            JOIN sale_items si ON p.id = si.product_id
-            JOIN sales s ON si.sale_id = s.id
-            WHERE DATE(s.sale_date) >= DATE('now', '-7 days') AND p.current_stock <= 10
-            GROUP BY p.id
-            HAVING recent_sales >= 5
-            ORDER BY recent_sales DESC
-        ''')
-        
-        for row in cursor.fetchall():
-            row = dict(row)
-            alerts.append({
-                'type': 'high_performer_low_stock',
-                'severity': 'warning',
-                'title': f'Produit performant en rupture: {row["name"]}',
-                'message': f'{row["recent_sales"]} ventes cette semaine, stock: {row["current_stock"]}',
-                'product_name': row['name'],
-                'priority': 3
-            })
-        
-        # Sort alerts by priority and severity
-        priority_order = {'critical': 3, 'warning': 2, 'info': 1}
-        alerts.sort(key=lambda x: (x['priority'], priority_order.get(x['severity'], 0)), reverse=True)
+            UNION ALL
+            SELECT * FROM (
+                -- 2: overdue debts, most overdue first
+                SELECT 2, -(julianday('now') - julianday(due_date)), client_name, remaining_amount,
+                       julianday('now') - julianday(due_date), due_date
+                FROM client_debts
+                WHERE status = 'pending' AND due_date < :today
+            )
+            UNION ALL
+            SELECT * FROM (
+                -- 3: unusual expense days (over twice the 30-day daily average)
+                SELECT 3, DATE(expense_date), NULL, SUM(amount) AS daily_total, NULL, DATE(expense_date)
+                FROM expenses
+                WHERE expense_date >= :since_7
+                GROUP BY DATE(expense_date)
+                HAVING daily_total > (
+                    SELECT AVG(daily_amount) * 2
+                    FROM (
+                        SELECT SUM(amount) as daily_amount
+                        FROM expenses
+                        WHERE expense_date >= :since_30
+                        GROUP BY DATE(expense_date)
+                    )
+                )
+            )
+            UNION ALL
+            SELECT * FROM (
+                -- 4: days since the last sale
+                SELECT 4, 0, NULL, NULL,
+                       julianday('now') - julianday(MAX(DATE(sale_date))), MAX(DATE(sale_date))
+                FROM sales
+            )
+            UNION ALL
+            SELECT * FROM (
+                -- 5: high performing products that are low in stock
+                SELECT 5, -SUM(si.quantity), p.name, p.current_stock, SUM(si.quantity) AS recent_sales, NULL
+                FROM products p
+                JOIN sale_items si ON p.id = si.product_id
+                JOIN sales s ON si.sale_id = s.id
+                WHERE s.sale_date >= :since_7 AND p.current_stock <= 10
+                GROUP BY p.id
+                HAVING recent_sales >= 5
+            )
+            ORDER BY src, ord
+        ''', {'today': _utc_cutoff(0), 'since_7': _utc_cutoff(7), 'since_30': _utc_cutoff(30)})
+        
+        for row in cursor:
+            src = row['src']
+            if src == 1:
+                # Low stock alerts with AI severity
+                alerts.append({
+                    'type': 'low_stock',
+                    'severity': row['info'],
+                    'title': f'Stock faible: {row["name"]}',
+                    'message': f'Stock actuel: {row["amount"]}. Rupture estimée dans {row["value"]} jours.',
+                    'product_name': row['name'],
+                    'priority': _SEVERITY_RANK[row['info']]
+                })
+            elif src == 2:
+                # Overdue debts alerts
+                days_overdue = int(row['value'])
+                severity = 'critical' if days_overdue > 30 else 'warning' if days_overdue > 7 else 'info'
+                
+                alerts.append({
+                    'type': 'overdue_debt',
+                    'severity': severity,
+                    'title': f'Dette en retard: {row["name"]}',
+                    'message': f"Montant: {row['amount']} {currency}. En retard de {days_overdue} jours.",
+                    'client_name': row['name'],
+                    'amount': row['amount'],
+                    'priority': 3 if severity == 'critical' else 2
+                })
+            elif src == 3:
+                # Unusual expense patterns
+                alerts.append({
+                    'type': 'unusual_expense',
+                    'severity': 'warning',
+                    'title': f'Dépenses élevées détectées',
+                    'message': f"Dépenses du {row['info']}: {row['amount']} {currency} (inhabituel)",
+                    'date': row['info'],
+                    'amount': row['amount'],
+                    'priority': 2
+                })
+            elif src == 4:
+                # Missing sales entries (no sales for 2+ days)
+                if row['value'] and row['value'] >= 2:
+                    days_since = int(row['value'])
+                    alerts.append({
+                        'type': 'missing_sales',
+                        'severity': 'warning' if days_since >= 3 else 'info',
+                        'title': 'Aucune vente récente',
+                        'message': f'Dernière vente il y a {days_since} jours. Vérifiez les saisies.',
+                        'days_since': days_since,
+                        'priority': 2 if days_since >= 3 else 1
+                    })
+            else:
+                # High performing products that are low in stock
+                alerts.append({
+                    'type': 'high_performer_low_stock',
+                    'severity': 'warning',
+                    'title': f'Produit performant en rupture: {row["name"]}',
+                    'message': f'{row["value"]} ventes cette semaine, stock: {row["amount"]}',
+                    'product_name': row['name'],
+                    'priority': 3
+                })
+        
+        # Highest priority/severity first; only the top _MAX_ALERTS are returned, picked
+        # with a bounded heap instead of sorting every alert
+        top_alerts = heapq.nlargest(
+            _MAX_ALERTS, alerts, key=lambda x: (x['priority'], _SEVERITY_RANK.get(x['severity'], 0))
+        )
         
         # Log smart alerts generation
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_smart_alerts',
             f'Alertes intelligentes générées: {len(alerts)} alertes'
         )
         
-        return jsonify({
+        severity_counts = Counter(a['severity'] for a in alerts)
+        return ojsonify({
             'success': True,
-            'alerts': alerts,
+            'alerts': top_alerts,
             'alert_counts': {
-                'critical': len([a for a in alerts if a['severity'] == 'critical']),
-                'warning': len([a for a in alerts if a['severity'] == 'warning']),
-                'info': len([a for a in alerts if a['severity'] == 'info'])
+                'critical': severity_counts['critical'],
+                'warning': severity_counts['warning'],
+                'info': severity_counts['info']
             },
             'generated_at': datetime.now().isoformat()
         })
@@ -677,6 +926,7 @@ def get_smart_alerts():
             pass
 
 @ai_bp.route('/summary-assistant', methods=['GET'])
+@cached_response(_CACHE_TIMEOUT_ALERTS)
 def get_ai_summary():
     """Generate natural language business summary (Phase 6.1)"""
     auth_check = require_auth()
@@ -691,55 +941,48 @@ def get_ai_summary():
         period = request.args.get('period', 'week')  # day, week, month
         
         if period == 'day':
-            date_filter = "DATE('now')"
+            since = _utc_cutoff(0)
             period_text = "aujourd'hui"
         elif period == 'week':
-            date_filter = "DATE('now', '-7 days')"
+            since = _utc_cutoff(7)
             period_text = "cette semaine"
         else:  # month
-            date_filter = "DATE('now', '-30 days')"
+            since = _utc_cutoff(30)
             period_text = "ce mois"
         
-        # Get key metrics
-        cursor.execute(f'''
-            SELECT 
-                COUNT(*) as sales_count,
-                SUM(total_amount) as revenue,
-                SUM((SELECT SUM(profit_margin) FROM sale_items WHERE sale_id = s.id)) as profit
-            FROM sales s
-            WHERE DATE(sale_date) >= {date_filter}
-        ''')
-        
-        metrics = dict(cursor.fetchone())
-        
-        # Get best selling product
-        cursor.execute(f'''
-            SELECT p.name, SUM(si.quantity) as quantity
-            FROM sale_items si
-            JOIN products p ON si.product_id = p.id
-            JOIN sales s ON si.sale_id = s.id
-            WHERE DATE(s.sale_date) >= {date_filter}
-            GROUP BY p.id
-            ORDER BY quantity DESC
-            LIMIT 1
-        ''')
-        
-        best_product = cursor.fetchone()
-        best_product = dict(best_product) if best_product else None
-        
-        # Get low stock count
-        cursor.execute('''
-            SELECT COUNT(*) FROM products 
-            WHERE is_active = 1 AND current_stock <= min_stock_alert
-        ''')
-        low_stock_count = cursor.fetchone()[0]
-        
-        # Get pending debts
+        # Key metrics, low stock count and pending debts in one round-trip
         cursor.execute('''
-            SELECT COUNT(*) as count, SUM(remaining_amount) as total
-            FROM client_debts WHERE status = 'pending'
-        ''')
-        debts = dict(cursor.fetchone())
+            SELECT
+                (SELECT COUNT(*) FROM sales WHERE sale_date >= :since) as sales_count,
+                (SELECT SUM(total_amount) FROM sales WHERE sale_date >= :since) as revenue,
+                (SELECT SUM(si.profit_margin) FROM sale_items si
+                 JOIN sales s ON si.sale_id = s.id WHERE s.sale_date >= :since) as profit,
+                (SELECT COUNT(*) FROM products
+                 WHERE is_active = 1 AND current_stock <= min_stock_alert) as low_stock_count,
+                (SELECT COUNT(*) FROM client_debts WHERE status = 'pending') as debt_count,
+                (SELECT SUM(remaining_amount) FROM client_debts WHERE status = 'pending') as debt_total
+        ''', {'since': since})
+        
+        row = cursor.fetchone()
+        metrics = {'sales_count': row['sales_count'], 'revenue': row['revenue'], 'profit': row['profit']}
+        low_stock_count = row['low_stock_count']
+        debts = {'count': row['debt_count'], 'total': row['debt_total']}
+        
+        # Get best selling product (only possible when there were sales in the period)
+        best_product = None
+        if metrics['sales_count']:
+            cursor.execute('''
+                SELECT p.name, SUM(si.quantity) as quantity
+                FROM sale_items si
+                JOIN products p ON si.product_id = p.id
+                JOIN sales s ON si.sale_id = s.id
+                WHERE s.sale_date >= ?
+                GROUP BY p.id
+                ORDER BY quantity DESC
+                LIMIT 1
+            ''', (since,))
+            best_product = cursor.fetchone()
+            best_product = dict(best_product) if best_product else None
         
         # Generate natural language summary
         summary_parts = []
@@ -749,8 +992,8 @@ def get_ai_summary():
         profit = metrics['profit'] or 0
         sales_count = metrics['sales_count'] or 0
         
+        _cur = _currency()
         if revenue > 0:
-            _cur = (db_manager.get_app_settings().get('currency') or 'MRU')
             summary_parts.append(f"Vous avez réalisé {revenue:,.0f} {_cur} de chiffre d'affaires {period_text}")
             if profit > 0:
                 margin = (profit / revenue * 100)
@@ -769,7 +1012,6 @@ def get_ai_summary():
         
         # Debt situation
         if debts['count'] and debts['count'] > 0:
-            _cur = (db_manager.get_app_settings().get('currency') or 'MRU')
             summary_parts.append(f"Vous avez {debts['count']} créance{'s' if debts['count'] > 1 else ''} en attente pour {debts['total']:,.0f} {_cur}")
         
         # Generate recommendations
@@ -793,13 +1035,13 @@ def get_ai_summary():
             summary_text += " Recommandations: " + "; ".join(recommendations) + "."
         
         # Log AI summary generation
-        db_manager.log_user_action(
+        log_action_async(
             session['user_id'],
             'ai_summary_assistant',
             f'Résumé IA généré pour période: {period}'
         )
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'summary': {
                 'text': summary_text,
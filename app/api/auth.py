@@ -5,25 +5,41 @@ Authentication API Blueprint
 Handles user authentication, session management, and user operations
 """
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, session
 from datetime import timedelta
 from flask import current_app
 from werkzeug.security import generate_password_hash
 from db.database import DatabaseManager
+from .json_utils import ojsonify
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 db_manager = DatabaseManager()
 
+# PIN hashing (scrypt, ~32 MB and tens of ms each) runs on a pool sized to the CPU count:
+# the hash releases the GIL so concurrent logins use every core, and a burst of them
+# queues here instead of oversubscribing CPU and memory
+_kdf_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix='pin-kdf')
+
+
+def _hash_pin(pin):
+    return _kdf_executor.submit(generate_password_hash, pin).result()
+
+
+def _authenticate(username, pin):
+    return _kdf_executor.submit(db_manager.authenticate_user, username, pin).result()
+
 @auth_bp.route('/login', methods=['POST'])
 def api_login():
     """API endpoint for user login"""
     data = request.get_json()
     
     if not data or not data.get('username') or not data.get('pin'):
-        return jsonify({'success': False, 'message': 'Nom d\'utilisateur et PIN requis'}), 400
+        return ojsonify({'success': False, 'message': 'Nom d\'utilisateur et PIN requis'}), 400
     
     username = data['username']
     pin = data['pin']
@@ -41,9 +57,9 @@ def api_login():
     attempts = session.get('failed_login_attempts', {})
     user_attempts = attempts.get(username, 0)
     if user_attempts >= max_attempts:
-        return jsonify({'success': False, 'message': 'Nombre maximal de tentatives atteint. Réessayez plus tard.'}), 429
+        return ojsonify({'success': False, 'message': 'Nombre maximal de tentatives atteint. Réessayez plus tard.'}), 429
 
-    user = db_manager.authenticate_user(username, pin)
+    user = _authenticate(username, pin)
     if user:
         # Reset attempts on success
         attempts[username] = 0
@@ -64,7 +80,7 @@ def api_login():
         # Log successful login
         db_manager.log_user_action(user['id'], 'login', f'Connexion API réussie pour {username}')
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'user': {
                 'id': user['id'],
@@ -77,7 +93,7 @@ def api_login():
         # Increment failed attempts
         attempts[username] = user_attempts + 1
         session['failed_login_attempts'] = attempts
-        return jsonify({'success': False, 'message': 'Nom d\'utilisateur ou PIN incorrect'}), 401
+        return ojsonify({'success': False, 'message': 'Nom d\'utilisateur ou PIN incorrect'}), 401
 
 @auth_bp.route('/logout', methods=['POST'])
 def api_logout():
@@ -85,14 +101,14 @@ def api_logout():
     if 'user_id' in session:
         db_manager.log_user_action(session['user_id'], 'logout', 'Déconnexion API')
         session.clear()
-        return jsonify({'success': True, 'message': 'Déconnexion réussie'})
-    return jsonify({'success': False, 'message': 'Aucune session active'}), 400
+        return ojsonify({'success': True, 'message': 'Déconnexion réussie'})
+    return ojsonify({'success': False, 'message': 'Aucune session active'}), 400
 
 @auth_bp.route('/status')
 def auth_status():
     """Check authentication status"""
     if 'user_id' in session:
-        return jsonify({
+        return ojsonify({
             'authenticated': True,
             'user': {
                 'id': session['user_id'],
@@ -101,19 +117,19 @@ def auth_status():
                 'language': session.get('language', 'fr')
             }
         })
-    return jsonify({'authenticated': False})
+    return ojsonify({'authenticated': False})
 
 @auth_bp.route('/create-user', methods=['POST'])
 def create_user():
     """Create new user (admin only)"""
     if session.get('user_role') != 'admin':
-        return jsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
+        return ojsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
     
     data = request.get_json()
     required_fields = ['username', 'pin', 'role']
     
     if not all(field in data for field in required_fields):
-        return jsonify({'success': False, 'message': 'Champs requis manquants'}), 400
+        return ojsonify({'success': False, 'message': 'Champs requis manquants'}), 400
     
     try:
         result = db_manager.create_user({
@@ -124,7 +140,7 @@ def create_user():
         })
 
         if not result.get('success'):
-            return jsonify({'success': False, 'message': result.get('error', "Erreur lors de la création de l'utilisateur")}), 400
+            return ojsonify({'success': False, 'message': result.get('error', "Erreur lors de la création de l'utilisateur")}), 400
 
         # Log user creation
         db_manager.log_user_action(
@@ -133,152 +149,141 @@ def create_user():
             f"Création utilisateur {data['username']}"
         )
 
-        return jsonify({'success': True, 'user_id': result.get('user_id'), 'message': 'Utilisateur créé avec succès'})
+        return ojsonify({'success': True, 'user_id': result.get('user_id'), 'message': 'Utilisateur créé avec succès'})
 
     except ValueError as e:
-        return jsonify({'success': False, 'message': str(e)}), 400
+        return ojsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"Error creating user: {e}")
-        return jsonify({'success': False, 'message': "Erreur lors de la création de l'utilisateur"}), 500
+        return ojsonify({'success': False, 'message': "Erreur lors de la création de l'utilisateur"}), 500
 
 @auth_bp.route('/change-pin', methods=['POST'])
 def change_pin():
     """Change user PIN"""
     if 'user_id' not in session:
-        return jsonify({'success': False, 'message': 'Non authentifié'}), 401
+        return ojsonify({'success': False, 'message': 'Non authentifié'}), 401
     
     data = request.get_json()
     if not data or not data.get('current_pin') or not data.get('new_pin'):
-        return jsonify({'success': False, 'message': 'PIN actuel et nouveau PIN requis'}), 400
-    
-    # Verify current PIN
-    user = db_manager.authenticate_user(session['username'], data['current_pin'])
-    if not user:
-        return jsonify({'success': False, 'message': 'PIN actuel incorrect'}), 401
+        return ojsonify({'success': False, 'message': 'PIN actuel et nouveau PIN requis'}), 400
     
     try:
-        # Update PIN
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        new_pin_hash = generate_password_hash(data['new_pin'])
-        cursor.execute('UPDATE users SET pin_hash = ? WHERE id = ?', (new_pin_hash, session['user_id']))
-        conn.commit()
-        conn.close()
-        
-        # Log PIN change
-        db_manager.log_user_action(session['user_id'], 'change_pin', 'Changement de PIN')
+        # Verify the current PIN and store the new one (both hashes run on the KDF pool)
+        rotated = _kdf_executor.submit(
+            db_manager.rotate_pin,
+            session['user_id'],
+            data['current_pin'],
+            data['new_pin'],
+            (session['user_id'], 'change_pin', 'Changement de PIN'),
+        ).result()
+        if not rotated:
+            return ojsonify({'success': False, 'message': 'PIN actuel incorrect'}), 401
         
-        return jsonify({'success': True, 'message': 'PIN modifié avec succès'})
+        return ojsonify({'success': True, 'message': 'PIN modifié avec succès'})
         
     except Exception as e:
         logger.error(f"Error changing PIN: {e}")
-        return jsonify({'success': False, 'message': 'Erreur lors du changement de PIN'}), 500
+        return ojsonify({'success': False, 'message': 'Erreur lors du changement de PIN'}), 500
+
+_USER_LIST_COLUMNS = ('id', 'username', 'role', 'language', 'created_at', 'last_login', 'is_active')
 
 @auth_bp.route('/users', methods=['GET'])
 def list_users():
     """List all users (admin only)"""
     if session.get('user_role') != 'admin':
-        return jsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
+        return ojsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
     
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, username, role, language, created_at, last_login, is_active
-            FROM users ORDER BY created_at DESC
-        ''')
-        users = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        with db_manager.acquire() as conn:
+            cursor = conn.cursor()
+            # Plain tuples zipped with the selected column names (no Row -> dict copies)
+            cursor.row_factory = None
+            cursor.execute('''
+                SELECT id, username, role, language, created_at, last_login, is_active
+                FROM users ORDER BY created_at DESC
+            ''')
+            users = [dict(zip(_USER_LIST_COLUMNS, row)) for row in cursor]
         
-        return jsonify({'success': True, 'users': users})
+        return ojsonify({'success': True, 'users': users})
         
     except Exception as e:
         logger.error(f"Error listing users: {e}")
-        return jsonify({'success': False, 'message': 'Erreur lors de la récupération des utilisateurs'}), 500
+        return ojsonify({'success': False, 'message': 'Erreur lors de la récupération des utilisateurs'}), 500
 
 @auth_bp.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     """Update user information (admin only)"""
     if session.get('user_role') != 'admin':
-        return jsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
+        return ojsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
     
     data = request.get_json()
     if not data:
-        return jsonify({'success': False, 'message': 'Données requises'}), 400
+        return ojsonify({'success': False, 'message': 'Données requises'}), 400
+    
+    # Build update query dynamically (the PIN is hashed before a connection is held)
+    update_fields = []
+    values = []
+    
+    if 'username' in data:
+        update_fields.append('username = ?')
+        values.append(data['username'])
+    
+    if 'role' in data:
+        update_fields.append('role = ?')
+        values.append(data['role'])
+    
+    if 'language' in data:
+        update_fields.append('language = ?')
+        values.append(data['language'])
+    
+    if 'is_active' in data:
+        update_fields.append('is_active = ?')
+        values.append(data['is_active'])
+    
+    if 'new_pin' in data:
+        update_fields.append('pin_hash = ?')
+        values.append(_hash_pin(data['new_pin']))
     
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        # Get current user data for logging
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        if not row:
-            conn.close()
-            return jsonify({'success': False, 'message': "Utilisateur introuvable"}), 404
-        old_user = dict(row)
-        
-        # Build update query dynamically
-        update_fields = []
-        values = []
-        
-        if 'username' in data:
-            update_fields.append('username = ?')
-            values.append(data['username'])
-        
-        if 'role' in data:
-            update_fields.append('role = ?')
-            values.append(data['role'])
+        # Audit setting read before the write transaction starts
+        audit = db_manager._audit_entry((session['user_id'], 'update_user', f'Mise à jour utilisateur ID {user_id}'))
+        with db_manager.acquire() as conn:
+            cursor = conn.cursor()
+            if update_fields:
+                # rowcount tells whether the user exists; the audit entry is written
+                # in the same transaction
+                values.append(user_id)
+                cursor.execute(f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?", values)
+                found = cursor.rowcount > 0
+                if found and audit:
+                    db_manager._insert_user_action(cursor, *audit)
+                conn.commit()
+            else:
+                found = cursor.execute('SELECT 1 FROM users WHERE id = ?', (user_id,)).fetchone() is not None
         
-        if 'language' in data:
-            update_fields.append('language = ?')
-            values.append(data['language'])
+        if not found:
+            return ojsonify({'success': False, 'message': "Utilisateur introuvable"}), 404
         
-        if 'is_active' in data:
-            update_fields.append('is_active = ?')
-            values.append(data['is_active'])
-        
-        if 'new_pin' in data:
-            update_fields.append('pin_hash = ?')
-            values.append(generate_password_hash(data['new_pin']))
-        
-        if update_fields:
-            values.append(user_id)
-            query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
-            cursor.execute(query, values)
-            conn.commit()
-            
-            # Log the update
-            db_manager.log_user_action(
-                session['user_id'],
-                'update_user',
-                f'Mise à jour utilisateur ID {user_id}'
-            )
-        
-        conn.close()
-        return jsonify({'success': True, 'message': 'Utilisateur mis à jour avec succès'})
+        return ojsonify({'success': True, 'message': 'Utilisateur mis à jour avec succès'})
         
     except Exception as e:
         logger.error(f"Error updating user: {e}")
-        return jsonify({'success': False, 'message': 'Erreur lors de la mise à jour de l\'utilisateur'}), 500
+        return ojsonify({'success': False, 'message': 'Erreur lors de la mise à jour de l\'utilisateur'}), 500
 
 @auth_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """Delete/deactivate user (admin only)"""
     if session.get('user_role') != 'admin':
-        return jsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
+        return ojsonify({'success': False, 'message': 'Accès administrateur requis'}), 403
     
     if user_id == session['user_id']:
-        return jsonify({'success': False, 'message': 'Impossible de supprimer votre propre compte'}), 400
+        return ojsonify({'success': False, 'message': 'Impossible de supprimer votre propre compte'}), 400
     
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
         # Deactivate instead of delete to preserve data integrity
-        cursor.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
-        conn.commit()
-        conn.close()
+        with db_manager.acquire() as conn:
+            conn.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
+            conn.commit()
         
         # Log the deactivation
         db_manager.log_user_action(
@@ -287,8 +292,8 @@ def delete_user(user_id):
             f'Désactivation utilisateur ID {user_id}'
         )
         
-        return jsonify({'success': True, 'message': 'Utilisateur désactivé avec succès'})
+        return ojsonify({'success': True, 'message': 'Utilisateur désactivé avec succès'})
         
     except Exception as e:
         logger.error(f"Error deactivating user: {e}")
-        return jsonify({'success': False, 'message': 'Erreur lors de la désactivation de l\'utilisateur'}), 500
+        return ojsonify({'success': False, 'message': 'Erreur lors de la désactivation de l\'utilisateur'}), 500
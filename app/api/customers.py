@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 """Customers API blueprint"""
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, session
 import logging
 from db.database import DatabaseManager
+from .json_utils import ojsonify
 
 logger = logging.getLogger(__name__)
 customers_bp = Blueprint('customers', __name__)
@@ -14,7 +15,7 @@ db_manager = DatabaseManager()
 
 def require_auth():
     if 'user_id' not in session:
-        return jsonify({'success': False, 'message': 'Non authentifié'}), 401
+        return ojsonify({'success': False, 'message': 'Non authentifié'}), 401
     return None
 
 
@@ -26,10 +27,10 @@ def list_customers():
         return auth_check
     try:
         customers = db_manager.get_customers_list()
-        return jsonify({'success': True, 'customers': customers})
+        return ojsonify({'success': True, 'customers': customers})
     except Exception as e:
         logger.error(f"Error fetching customers: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 
 @customers_bp.route('/customers/<int:customer_id>', methods=['GET'])
@@ -40,11 +41,11 @@ def get_customer(customer_id):
     try:
         customer = db_manager.get_customer_by_id(customer_id)
         if customer:
-            return jsonify({'success': True, 'customer': customer})
-        return jsonify({'success': False, 'error': 'Client non trouvé'}), 404
+            return ojsonify({'success': True, 'customer': customer})
+        return ojsonify({'success': False, 'error': 'Client non trouvé'}), 404
     except Exception as e:
         logger.error(f"Error fetching customer {customer_id}: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 
 @customers_bp.route('/customers/<int:customer_id>', methods=['PUT'])
@@ -60,21 +61,21 @@ def update_customer(customer_id):
     address = data.get('address', '')
 
     if not name:
-        return jsonify({'success': False, 'error': 'Nom requis'}), 400
+        return ojsonify({'success': False, 'error': 'Nom requis'}), 400
     
     # Basic email validation
     if email and '@' not in email:
-        return jsonify({'success': False, 'error': 'Format email invalide'}), 400
+        return ojsonify({'success': False, 'error': 'Format email invalide'}), 400
     
     try:
         success = db_manager.update_customer(customer_id, name, phone, email, address)
         if success:
             db_manager.log_user_action(session['user_id'], 'update_client', f'Mise à jour client ID {customer_id} ({name})')
-            return jsonify({'success': True})
-        return jsonify({'success': False, 'error': 'Client non trouvé ou aucune modification'}), 404
+            return ojsonify({'success': True})
+        return ojsonify({'success': False, 'error': 'Client non trouvé ou aucune modification'}), 404
     except Exception as e:
         logger.error(f"Error updating customer {customer_id}: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 
 @customers_bp.route('/customers/<int:customer_id>', methods=['DELETE'])
@@ -87,11 +88,11 @@ def delete_customer(customer_id):
         success = db_manager.delete_customer(customer_id)
         if success:
             db_manager.log_user_action(session['user_id'], 'delete_client', f'Suppression client ID {customer_id}')
-            return jsonify({'success': True})
-        return jsonify({'success': False, 'error': 'Client non trouvé'}), 404
+            return ojsonify({'success': True})
+        return ojsonify({'success': False, 'error': 'Client non trouvé'}), 404
     except Exception as e:
         logger.error(f"Error deleting customer {customer_id}: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 
 @customers_bp.route('/customers', methods=['POST'])
@@ -108,12 +109,12 @@ def add_customer():
     address = data.get('address', '')
 
     if not name:
-        return jsonify({'success': False, 'error': 'Nom requis'}), 400
+        return ojsonify({'success': False, 'error': 'Nom requis'}), 400
     try:
         customer_id = db_manager.create_customer(name, phone, email, address)
         if customer_id:
             db_manager.log_user_action(session['user_id'], 'create_client', f'Création client: {name}')
-        return jsonify({'success': True, 'customer_id': customer_id})
+        return ojsonify({'success': True, 'customer_id': customer_id})
     except Exception as e:
         logger.error(f"Error creating customer: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
@@ -5,12 +5,16 @@ Dashboard API for Quincaillerie & SME Management App
 Provides endpoints for dashboard data
 """
 
-from flask import Blueprint, jsonify, session, request
+from flask import Blueprint, session, request, Response, g
 from datetime import datetime, timedelta
+from functools import wraps
 import logging
 import re
 import json
-from db.database import DatabaseManager
+import threading
+import time
+from db.database import DatabaseManager, ACTIVITY_TYPE_SQL, ACTIVITY_AGE_SQL
+from .json_utils import ojsonify
 import difflib
 
 # Prefer rapidfuzz if available for better fuzzy matching, but allow fallback to difflib
@@ -49,67 +53,58 @@ logger = logging.getLogger(__name__)
 dashboard_bp = Blueprint('dashboard', __name__)
 db_manager = DatabaseManager()
 
+# The dashboard polls these endpoints every few seconds from each open browser; their
+# JSON bodies are kept for a few seconds (and dropped after any write request)
+_POLL_CACHE_TTL = 8
+_POLL_CACHE_MAX = 64
+_poll_cache = {}
+_poll_cache_lock = threading.Lock()
+
+
+@dashboard_bp.after_app_request
+def _invalidate_poll_cache(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and _poll_cache:
+        with _poll_cache_lock:
+            _poll_cache.clear()
+    return response
+
+
+def poll_cached(view):
+    """Serve a successful JSON body from the short-lived cache, keyed by path and query string.
+    Failures (answered through _poll_error) are never stored."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.full_path
+        now = time.monotonic()
+        with _poll_cache_lock:
+            hit = _poll_cache.get(key)
+        if hit is not None and hit[0] > now:
+            return Response(hit[1], mimetype='application/json')
+        response = view(*args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200 and not g.get('poll_failed'):
+            with _poll_cache_lock:
+                if len(_poll_cache) >= _POLL_CACHE_MAX:
+                    _poll_cache.clear()
+                _poll_cache[key] = (now + _POLL_CACHE_TTL, response.get_data())
+        return response
+    return wrapper
+
+
+def _poll_error(e):
+    """{'success': False} body for a polled view; flags the request so poll_cached skips it"""
+    g.poll_failed = True
+    return ojsonify({'success': False, 'error': str(e)})
+
 @dashboard_bp.route('/stats')
+@poll_cached
 def get_dashboard_stats():
     """Get all dashboard statistics in a single API call (numeric values)."""
     try:
-        # Get basic stats
-        total_products = db_manager.get_total_products()
-
-        # Get low stock items
-        low_stock_items = db_manager.get_low_stock_items()
-
-        # Get today's sales
-        today_sales = db_manager.get_today_sales()
-        today_sales_count = today_sales.get('count', 0)
-        today_sales_amount = today_sales.get('total', 0) or 0
-
-        # Get pending debts
-        pending_debts = db_manager.get_pending_debts()
-        pending_debts_count = pending_debts.get('count', 0)
-        pending_debts_amount = pending_debts.get('total', 0) or 0
-        # Get overdue debts (explicitly overdue by due_date < today)
-        try:
-            overdue_debts = db_manager.get_overdue_debts()
-            overdue_debts_count = int(overdue_debts.get('count', 0))
-            overdue_debts_amount = float(overdue_debts.get('total', 0) or 0)
-        except Exception:
-            overdue_debts_count = 0
-            overdue_debts_amount = 0.0
-
-        # Get total revenue
-        total_revenue = db_manager.get_total_revenue() or 0
-
-        # Get cash balance
-        cash_balance = db_manager.get_cash_balance() or 0
-
-        # Calculate yesterday's sales for comparison
-        yesterday_total = 0.0
-        conn = None
-        try:
-            conn = db_manager.get_connection()
-            cursor = conn.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute(
-                '''
-                SELECT SUM(total_amount) as total, COUNT(*) as count
-                FROM sales
-                WHERE DATE(sale_date) = DATE(?, '-1 day')
-                AND is_deleted = 0
-                ''',
-                (today,),
-            )
-            row = cursor.fetchone()
-            if row and row['total'] is not None:
-                yesterday_total = float(row['total']) or 0.0
-        except Exception as _e:
-            yesterday_total = 0.0
-        finally:
-            try:
-                if conn:
-                    conn.close()
-            except Exception:
-                pass
+        # Products, today's/yesterday's sales, debts, revenue and cash balance in one query
+        snap = db_manager.get_dashboard_snapshot()
+        low_stock_items = snap['low_stock_items']
+        today_sales_amount = snap['today_sales']
+        yesterday_total = snap['yesterday_sales']
 
         # Calculate sales change percentage
         sales_change = 0.0
@@ -120,26 +115,26 @@ def get_dashboard_stats():
                 sales_change = 0.0
 
         # Return numeric stats (frontend formats currency)
-        return jsonify({
+        return ojsonify({
             'success': True,
             'stats': {
-                'total_products': int(total_products or 0),
-                'low_stock_count': len(low_stock_items) if isinstance(low_stock_items, list) else int(low_stock_items or 0),
+                'total_products': int(snap['total_products']),
+                'low_stock_count': len(low_stock_items),
                 'low_stock_items': low_stock_items,
-                'today_sales_count': int(today_sales_count or 0),
-                'today_sales': float(today_sales_amount or 0),
-                'total_revenue': float(total_revenue or 0),
-                'pending_debts_count': int(pending_debts_count or 0),
-                'pending_debts': float(pending_debts_amount or 0),
-                'overdue_debts_count': overdue_debts_count,
-                'overdue_debts': overdue_debts_amount,
-                'cash_balance': float(cash_balance or 0),
+                'today_sales_count': int(snap['today_sales_count']),
+                'today_sales': today_sales_amount,
+                'total_revenue': snap['total_revenue'],
+                'pending_debts_count': int(snap['pending_debts_count']),
+                'pending_debts': snap['pending_debts'],
+                'overdue_debts_count': int(snap['overdue_debts_count']),
+                'overdue_debts': snap['overdue_debts'],
+                'cash_balance': snap['cash_balance'],
                 'sales_change': round(float(sales_change), 1)
             }
         })
     except Exception as e:
         logger.error(f"Error fetching dashboard stats: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return _poll_error(e)
 
 @dashboard_bp.route('/yesterday-sales')
 def get_yesterday_sales():
@@ -163,10 +158,10 @@ def get_yesterday_sales():
             'total': float(row['total']) if row and row['total'] else 0.0,
             'count': int(row['count']) if row and row['count'] else 0,
         }
-        return jsonify({'success': True, 'yesterday': result})
+        return ojsonify({'success': True, 'yesterday': result})
     except Exception as e:
         logger.error(f"Error fetching yesterday sales: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
     finally:
         try:
             if conn:
@@ -175,6 +170,7 @@ def get_yesterday_sales():
             pass
 
 @dashboard_bp.route('/activities')
+@poll_cached
 def get_dashboard_activities():
     """Get recent activities for dashboard"""
     try:
@@ -231,21 +227,27 @@ def get_dashboard_activities():
 
                 # Choose a safe select expression and ordering depending on available columns
                 if has_action_time and has_created_at:
-                    select_time = 'COALESCE(a.action_time, a.created_at) as created_at'
-                    order_by = 'COALESCE(a.action_time, a.created_at) DESC'
+                    time_column = 'COALESCE(a.action_time, a.created_at)'
                 elif has_action_time:
-                    select_time = 'a.action_time as created_at'
-                    order_by = 'a.action_time DESC'
+                    time_column = 'a.action_time'
                 elif has_created_at:
-                    select_time = 'a.created_at as created_at'
-                    order_by = 'a.created_at DESC'
+                    time_column = 'a.created_at'
                 else:
                     # No timestamp columns available; fall back to id ordering
+                    time_column = None
+
+                if time_column:
+                    select_time = f'{time_column} as created_at'
+                    select_age = ACTIVITY_AGE_SQL.format(column=time_column)
+                    order_by = f'{time_column} DESC'
+                else:
                     select_time = 'a.id as created_at'
+                    select_age = 'NULL'
                     order_by = 'a.id DESC'
 
                 query = (
-                    f"SELECT a.id, a.action_type, a.description, {select_time}, u.username "
+                    f"SELECT a.id, a.action_type, a.description, {select_time}, u.username, "
+                    f"{ACTIVITY_TYPE_SQL} AS activity_type, {select_age} AS age_seconds "
                     "FROM user_activity_log a JOIN users u ON a.user_id = u.id "
                     f"WHERE {where_sql} ORDER BY {order_by} LIMIT ?"
                 )
@@ -258,11 +260,11 @@ def get_dashboard_activities():
         else:
             activities = db_manager.get_recent_activities(limit=limit)
         
-        # Format activities for frontend display
+        # Format activities for frontend display (type and age come from the query)
         formatted_activities = []
         for activity in activities:
-            activity_type = determine_activity_type(activity.get('action_type', '') or '')
-            time_ago = format_time_ago(activity.get('created_at', '') or activity.get('action_time', ''))
+            activity_type = activity.get('activity_type') or 'other'
+            time_ago = format_age(activity.get('age_seconds'))
 
             # Include structured fields if present so the frontend can link to affected records
             formatted_activities.append({
@@ -276,10 +278,10 @@ def get_dashboard_activities():
                 'meta': activity.get('meta') if activity.get('meta') is not None else None
             })
         
-        return jsonify({'success': True, 'activities': formatted_activities})
+        return ojsonify({'success': True, 'activities': formatted_activities})
     except Exception as e:
         logger.error(f"Error fetching activities: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return _poll_error(e)
 
 
 @dashboard_bp.route('/activities/matches')
@@ -409,7 +411,7 @@ def activity_matches():
     try:
         aid = request.args.get('id')
         if not aid:
-            return jsonify({'success': False, 'error': 'id is required'}), 400
+            return ojsonify({'success': False, 'error': 'id is required'}), 400
 
         conn = db_manager.get_connection()
         cursor = conn.cursor()
@@ -418,7 +420,7 @@ def activity_matches():
         row = cursor.fetchone()
         if not row:
             conn.close()
-            return jsonify({'success': False, 'error': 'activity not found'}), 404
+            return ojsonify({'success': False, 'error': 'activity not found'}), 404
 
         desc = row['description'] if 'description' in row.keys() and row['description'] else ''
         meta = None
@@ -437,10 +439,10 @@ def activity_matches():
         candidates = score_candidates(rows, amount, customer)[:20]
 
         conn.close()
-        return jsonify({'success': True, 'candidates': candidates, 'parsed': {'amount': amount, 'customer': customer}})
+        return ojsonify({'success': True, 'candidates': candidates, 'parsed': {'amount': amount, 'customer': customer}})
     except Exception as e:
         logger.error(f"Error finding activity matches: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 
 @dashboard_bp.route('/activities/bulk-match', methods=['POST'])
@@ -485,14 +487,14 @@ def activity_bulk_match():
                 continue
 
         conn.close()
-        return jsonify({'success': True, 'results': results})
+        return ojsonify({'success': True, 'results': results})
     except Exception as e:
         logger.error(f"Error in bulk matching: {e}")
         try:
             conn.close()
         except Exception:
             pass
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 
 @dashboard_bp.route('/activities/confirm-match', methods=['POST'])
@@ -504,7 +506,7 @@ def activity_confirm_match():
         table = data.get('table_affected')
         rid = data.get('record_id')
         if not aid or not table or not rid:
-            return jsonify({'success': False, 'error': 'activity_id, table_affected and record_id are required'}), 400
+            return ojsonify({'success': False, 'error': 'activity_id, table_affected and record_id are required'}), 400
 
         conn = db_manager.get_connection()
         cursor = conn.cursor()
@@ -513,12 +515,13 @@ def activity_confirm_match():
         cursor.execute('UPDATE user_activity_log SET table_affected = ?, record_id = ?, meta = COALESCE(meta, ?) WHERE id = ?', (table, rid, meta, aid))
         conn.commit()
         conn.close()
-        return jsonify({'success': True})
+        return ojsonify({'success': True})
     except Exception as e:
         logger.error(f"Error confirming activity match: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return ojsonify({'success': False, 'error': str(e)})
 
 @dashboard_bp.route('/top-products')
+@poll_cached
 def get_top_products():
     """Get top selling products"""
     try:
@@ -538,61 +541,37 @@ def get_top_products():
                 # If casting fails, leave as-is
                 pass
         
-        return jsonify({'success': True, 'products': products})
+        return ojsonify({'success': True, 'products': products})
     except Exception as e:
         logger.error(f"Error fetching top products: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return _poll_error(e)
 
 @dashboard_bp.route('/sales-chart')
+@poll_cached
 def get_sales_chart_data():
     """Get data for sales chart"""
     try:
         # Get sales chart data
         chart_data = db_manager.get_sales_chart_data(days=7)
         
-        return jsonify({
+        return ojsonify({
             'success': True, 
             'daily': chart_data['daily'],
             'weekly': chart_data['weekly']
         })
     except Exception as e:
         logger.error(f"Error fetching sales chart data: {e}")
-        return jsonify({'success': False, 'error': str(e)})
-
-def determine_activity_type(action_type):
-    """Determine activity type based on action_type"""
-    action_type = action_type.lower()
-    
-    if 'vente' in action_type or 'sale' in action_type:
-        return 'sale'
-    elif 'stock' in action_type or 'inventory' in action_type:
-        return 'stock'
-    elif 'login' in action_type or 'connexion' in action_type:
-        return 'login'
-    elif 'paiement' in action_type or 'payment' in action_type:
-        return 'payment'
-    else:
-        return 'other'
-
-def format_time_ago(timestamp_str):
-    """Format timestamp as 'time ago'"""
-    if not timestamp_str:
-        return "Récemment"
-    
-    try:
-        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        now = datetime.now()
-        diff = now - timestamp
-        
-        if diff.days > 0:
-            return f"Il y a {diff.days} jour{'s' if diff.days > 1 else ''}"
-        elif diff.seconds >= 3600:
-            hours = diff.seconds // 3600
-            return f"Il y a {hours} heure{'s' if hours > 1 else ''}"
-        elif diff.seconds >= 60:
-            minutes = diff.seconds // 60
-            return f"Il y a {minutes} minute{'s' if minutes > 1 else ''}"
-        else:
-            return "À l'instant"
-    except Exception:
+        return _poll_error(e)
+
+# Largest unit first: an age is shown in the biggest unit it reaches
+_AGE_UNITS = ((86400, 'jour'), (3600, 'heure'), (60, 'minute'))
+
+def format_age(seconds):
+    """Format an age in seconds as 'time ago' (None when the timestamp was missing or unparsable)"""
+    if seconds is None:
         return "Récemment"
+    for unit_seconds, unit in _AGE_UNITS:
+        if seconds >= unit_seconds:
+            count = seconds // unit_seconds
+            return f"Il y a {count} {unit}{'s' if count > 1 else ''}"
+    return "À l'instant"
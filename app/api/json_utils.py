@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON responses for the API blueprints
+Encoded with orjson when it is installed, Flask's jsonify otherwise
+"""
+
+from flask import Response, jsonify
+
+# Optional dependency: orjson (faster JSON responses)
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional dep may be absent
+    orjson = None  # Fallback to Flask's jsonify
+
+
+def ojsonify(payload):
+    """jsonify() replacement that encodes with orjson when it is installed.
+
+    Payloads orjson can't encode (e.g. Decimal) go through jsonify() unchanged.
+    """
+    if orjson is not None:
+        try:
+            return Response(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS), mimetype='application/json')
+        except TypeError:
+            pass
+    return jsonify(payload)
@@ -43,6 +43,10 @@ app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # Enable/disable debug and test pages via environment flag (default off)
 app.config['DEBUG_PAGES'] = os.environ.get('DEBUG_PAGES', '0') in ('1', 'true', 'True')
+# Let the front web server stream backup downloads instead of the Python worker:
+# USE_X_SENDFILE for Apache/lighttpd, BACKUP_ACCEL_REDIRECT (e.g. /_internal_backups/) for nginx
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') in ('1', 'true', 'True')
+app.config['BACKUP_ACCEL_REDIRECT'] = os.environ.get('BACKUP_ACCEL_REDIRECT', '')
 
 # Load VAPID keys from environment or generate if missing
 import base64
@@ -195,6 +199,9 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# French-style money: '1,234.50' -> '1 234,50' in a single translate() pass
+_MONEY_TRANS = str.maketrans({',': ' ', '.': ','})
+
 @app.context_processor
 def inject_globals():
     """Inject global variables into all templates"""
@@ -219,7 +226,7 @@ def inject_globals():
         try:
             num = float(value or 0)
             # French-style formatting: space thousands, comma decimals
-            formatted = f"{num:,.2f}".replace(',', ' ').replace('.', ',')
+            formatted = format(num, ',.2f').translate(_MONEY_TRANS)
             return f"{formatted} {current_currency}"
         except Exception:
             return f"0,00 {current_currency}"
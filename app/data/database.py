@@ -8,16 +8,136 @@ Handles all database operations with SQLite (offline-first)
 import sqlite3
 import os
 import json
+import hmac
+import secrets
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 import logging
 
+try:
+    from .pool import get_conn, get_pool, acquire
+except ImportError:
+    # Imported as a top-level module (app/data on sys.path)
+    from pool import get_conn, get_pool, acquire
+
 
 # Get the application directory
 app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 logger = logging.getLogger(__name__)
 
+# Successful PIN checks, so repeat logins skip the deliberately slow password hash.
+# Keys are (stored pin_hash, HMAC of the PIN under a per-process key): a changed PIN
+# changes the stored hash, so stale entries can never match. Failures are not cached.
+_PIN_CACHE_SIZE = 256
+_pin_cache_key = secrets.token_bytes(32)
+_verified_pins = OrderedDict()
+_verified_pins_lock = threading.Lock()
+
+
+def _check_pin(pin_hash, pin):
+    """check_password_hash() with the result of successful checks remembered"""
+    key = (pin_hash, hmac.new(_pin_cache_key, str(pin).encode('utf-8'), 'sha256').digest())
+    with _verified_pins_lock:
+        if key in _verified_pins:
+            _verified_pins.move_to_end(key)
+            return True
+    if not check_password_hash(pin_hash, pin):
+        return False
+    with _verified_pins_lock:
+        _verified_pins[key] = True
+        if len(_verified_pins) > _PIN_CACHE_SIZE:
+            _verified_pins.popitem(last=False)
+    return True
+
+# Composite indexes for the stock/debt/date-range filters of the AI and alert queries
+# (date filters compare the bare column, e.g. sale_date >= DATE('now', '-30 days'), so they can seek)
+QUERY_INDEXES = (
+    ('products', 'CREATE INDEX IF NOT EXISTS idx_products_active_stock ON products(is_active, current_stock, min_stock_alert)'),
+    ('client_debts', 'CREATE INDEX IF NOT EXISTS idx_client_debts_status_due ON client_debts(status, due_date)'),
+    ('sales', 'CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date)'),
+    ('sale_items', 'CREATE INDEX IF NOT EXISTS idx_sale_items_product ON sale_items(product_id, sale_id)'),
+    ('sale_items', 'CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id, profit_margin)'),
+    ('expenses', 'CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(expense_date)'),
+    ('ai_predictions', 'CREATE INDEX IF NOT EXISTS idx_ai_predictions_type_created ON ai_predictions(prediction_type, created_at)'),
+)
+
+# financial_summary (single row, id = 1) holds the totals behind the capital-efficiency
+# analysis; these triggers keep it current so readers don't scan four tables
+FINANCIAL_SUMMARY_SOURCES = ('capital_entries', 'products', 'sale_items', 'sales')
+FINANCIAL_SUMMARY_REFRESH = '''
+    INSERT OR REPLACE INTO financial_summary (id, total_capital, stock_value, total_profit, total_revenue)
+    SELECT 1,
+        (SELECT COALESCE(SUM(amount), 0) FROM capital_entries),
+        (SELECT COALESCE(SUM(purchase_price * current_stock), 0) FROM products WHERE is_active = 1),
+        (SELECT COALESCE(SUM(profit_margin), 0) FROM sale_items),
+        (SELECT COALESCE(SUM(total_amount), 0) FROM sales)
+'''
+_STOCK_VALUE = 'CASE WHEN {row}.is_active = 1 THEN COALESCE({row}.purchase_price * {row}.current_stock, 0) ELSE 0 END'
+FINANCIAL_SUMMARY_TRIGGERS = {
+    'trg_fs_capital_insert': 'AFTER INSERT ON capital_entries BEGIN UPDATE financial_summary SET total_capital = total_capital + COALESCE(NEW.amount, 0) WHERE id = 1; END',
+    'trg_fs_capital_delete': 'AFTER DELETE ON capital_entries BEGIN UPDATE financial_summary SET total_capital = total_capital - COALESCE(OLD.amount, 0) WHERE id = 1; END',
+    'trg_fs_capital_update': 'AFTER UPDATE OF amount ON capital_entries BEGIN UPDATE financial_summary SET total_capital = total_capital + COALESCE(NEW.amount, 0) - COALESCE(OLD.amount, 0) WHERE id = 1; END',
+    'trg_fs_products_insert': f"AFTER INSERT ON products BEGIN UPDATE financial_summary SET stock_value = stock_value + {_STOCK_VALUE.format(row='NEW')} WHERE id = 1; END",
+    'trg_fs_products_delete': f"AFTER DELETE ON products BEGIN UPDATE financial_summary SET stock_value = stock_value - {_STOCK_VALUE.format(row='OLD')} WHERE id = 1; END",
+    'trg_fs_products_update': f"AFTER UPDATE OF purchase_price, current_stock, is_active ON products BEGIN UPDATE financial_summary SET stock_value = stock_value + {_STOCK_VALUE.format(row='NEW')} - {_STOCK_VALUE.format(row='OLD')} WHERE id = 1; END",
+    'trg_fs_sale_items_insert': 'AFTER INSERT ON sale_items BEGIN UPDATE financial_summary SET total_profit = total_profit + COALESCE(NEW.profit_margin, 0) WHERE id = 1; END',
+    'trg_fs_sale_items_delete': 'AFTER DELETE ON sale_items BEGIN UPDATE financial_summary SET total_profit = total_profit - COALESCE(OLD.profit_margin, 0) WHERE id = 1; END',
+    'trg_fs_sale_items_update': 'AFTER UPDATE OF profit_margin ON sale_items BEGIN UPDATE financial_summary SET total_profit = total_profit + COALESCE(NEW.profit_margin, 0) - COALESCE(OLD.profit_margin, 0) WHERE id = 1; END',
+    'trg_fs_sales_insert': 'AFTER INSERT ON sales BEGIN UPDATE financial_summary SET total_revenue = total_revenue + COALESCE(NEW.total_amount, 0) WHERE id = 1; END',
+    'trg_fs_sales_delete': 'AFTER DELETE ON sales BEGIN UPDATE financial_summary SET total_revenue = total_revenue - COALESCE(OLD.total_amount, 0) WHERE id = 1; END',
+    'trg_fs_sales_update': 'AFTER UPDATE OF total_amount ON sales BEGIN UPDATE financial_summary SET total_revenue = total_revenue + COALESCE(NEW.total_amount, 0) - COALESCE(OLD.total_amount, 0) WHERE id = 1; END',
+}
+
+# Dashboard activity feed columns, computed in SQL so the endpoint only formats strings:
+# the activity type (keywords tried in priority order, a sale mentioning stock is a sale)
+# and the age in seconds of the UTC CURRENT_TIMESTAMP the log rows are written with
+ACTIVITY_TYPE_SQL = """CASE
+    WHEN a.action_type LIKE '%vente%' OR a.action_type LIKE '%sale%' THEN 'sale'
+    WHEN a.action_type LIKE '%stock%' OR a.action_type LIKE '%inventory%' THEN 'stock'
+    WHEN a.action_type LIKE '%login%' OR a.action_type LIKE '%connexion%' THEN 'login'
+    WHEN a.action_type LIKE '%paiement%' OR a.action_type LIKE '%payment%' THEN 'payment'
+    ELSE 'other' END"""
+ACTIVITY_AGE_SQL = "CAST(strftime('%s', 'now') - strftime('%s', {column}) AS INTEGER)"
+# Display time (dd/mm/yyyy HH:MM), or the raw value when SQLite can't parse it
+ACTIVITY_TIME_SQL = "COALESCE(strftime('%d/%m/%Y %H:%M', {column}), {column})"
+
+
+# Dashboard /stats figures: key -> (table, scalar sub-query). Each one is selected only
+# when its table has the columns listed in _DASHBOARD_METRIC_COLUMNS.
+_DASHBOARD_METRICS = {
+    'total_products': ('products', "SELECT COUNT(*) FROM products WHERE is_active = 1"),
+    'today_sales_count': ('sales', "SELECT COUNT(*) FROM sales WHERE DATE(sale_date) = :today AND is_deleted = 0"),
+    'today_sales': ('sales', "SELECT SUM(total_amount) FROM sales WHERE DATE(sale_date) = :today AND is_deleted = 0"),
+    'yesterday_sales': ('sales', "SELECT SUM(total_amount) FROM sales "
+                                 "WHERE DATE(sale_date) = DATE(:today, '-1 day') AND is_deleted = 0"),
+    'pending_debts_count': ('client_debts', "SELECT COUNT(*) FROM client_debts "
+                                            "WHERE remaining_amount > 0 AND status = 'pending'"),
+    'pending_debts': ('client_debts', "SELECT SUM(remaining_amount) FROM client_debts "
+                                      "WHERE remaining_amount > 0 AND status = 'pending'"),
+    'overdue_debts_count': ('client_debts', "SELECT COUNT(*) FROM client_debts WHERE remaining_amount > 0 "
+                                            "AND due_date IS NOT NULL AND DATE(due_date) < DATE('now')"),
+    'overdue_debts': ('client_debts', "SELECT SUM(remaining_amount) FROM client_debts WHERE remaining_amount > 0 "
+                                      "AND due_date IS NOT NULL AND DATE(due_date) < DATE('now')"),
+    'total_revenue': ('sales', "SELECT SUM(total_amount) FROM sales WHERE is_deleted = 0"),
+    'total_expenses': ('expenses', "SELECT SUM(amount) FROM expenses {expense_filter}"),
+}
+_DASHBOARD_METRIC_COLUMNS = {
+    'total_products': {'is_active'},
+    'today_sales_count': {'sale_date', 'is_deleted'},
+    'today_sales': {'sale_date', 'is_deleted', 'total_amount'},
+    'yesterday_sales': {'sale_date', 'is_deleted', 'total_amount'},
+    'pending_debts_count': {'remaining_amount', 'status'},
+    'pending_debts': {'remaining_amount', 'status'},
+    'overdue_debts_count': {'remaining_amount', 'due_date'},
+    'overdue_debts': {'remaining_amount', 'due_date'},
+    'total_revenue': {'total_amount', 'is_deleted'},
+    'total_expenses': {'amount'},
+}
+_DASHBOARD_COUNTS = ('total_products', 'today_sales_count', 'pending_debts_count', 'overdue_debts_count')
+
 
 class DatabaseManager:
     def create_notification(self, type, message, url=None, user_id=None):
@@ -97,11 +217,16 @@ class DatabaseManager:
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
     
     def get_connection(self):
-        """Get database connection with row factory"""
-        logger.info(f"Connecting to database at: {self.db_path}")
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get a pooled database connection with row factory (close() returns it to the pool)"""
+        return get_conn(self.db_path)
+
+    def acquire(self):
+        """Context manager variant of get_connection(): the connection goes back to the pool on exit"""
+        return acquire(self.db_path)
+
+    def pool_stats(self):
+        """Connection pool counters for this database (active/idle/total_acquisitions)"""
+        return get_pool(self.db_path).stats()
     
     def init_database(self):
         """Initialize database with all required tables"""
@@ -258,6 +383,16 @@ class DatabaseManager:
             if 'updated_at' not in sales_cols:
                 cursor.execute("ALTER TABLE sales ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
 
+            # Partial index over live sales: serves COUNT(*) WHERE is_deleted = 0 and
+            # recent-sales listings ordered by date without scanning the table
+            if 'is_deleted' in sales_cols:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_sales_active_date'")
+                new_sales_index = cursor.fetchone() is None
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_active_date ON sales(sale_date DESC) WHERE is_deleted = 0')
+                if new_sales_index:
+                    # Refresh planner statistics so the new index gets picked up
+                    cursor.execute('ANALYZE sales')
+
             # Sale details table (for items in each sale)
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS sale_details (
@@ -358,6 +493,10 @@ class DatabaseManager:
                 )
             ''')
             
+            self._ensure_financial_summary(cursor)
+            self._ensure_prediction_hash(cursor)
+            self._ensure_query_indexes(cursor)
+
             # Create a default admin user if none exists
             cursor.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
             if cursor.fetchone()[0] == 0:
@@ -383,6 +522,44 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def _ensure_prediction_hash(self, cursor):
+        """ai_predictions.data_hash lets the AI endpoints skip rewriting unchanged predictions"""
+        cursor.execute('PRAGMA table_info(ai_predictions)')
+        cols = [col[1] for col in cursor.fetchall()]
+        if cols and 'data_hash' not in cols:
+            cursor.execute("ALTER TABLE ai_predictions ADD COLUMN data_hash TEXT")
+
+    def _ensure_query_indexes(self, cursor):
+        """Indexes behind the AI/alert queries, created for whichever tables this database has"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        for table, statement in QUERY_INDEXES:
+            if table in tables:
+                cursor.execute(statement)
+
+    def _ensure_financial_summary(self, cursor):
+        """Create financial_summary and its triggers, then resync it from the source tables.
+        The resync runs at every startup so rounding drift in the running totals can't build up.
+        """
+        placeholders = ','.join('?' * len(FINANCIAL_SUMMARY_SOURCES))
+        cursor.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+                       FINANCIAL_SUMMARY_SOURCES)
+        if cursor.fetchone()[0] < len(FINANCIAL_SUMMARY_SOURCES):
+            # Legacy tables (capital_entries, sale_items) not present: readers fall back to live aggregates
+            return
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS financial_summary (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_capital REAL NOT NULL DEFAULT 0,
+                stock_value REAL NOT NULL DEFAULT 0,
+                total_profit REAL NOT NULL DEFAULT 0,
+                total_revenue REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        for name, body in FINANCIAL_SUMMARY_TRIGGERS.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+        cursor.execute(FINANCIAL_SUMMARY_REFRESH)
+
     def authenticate_user(self, username, pin):
         """Authenticate a user with username and PIN"""
         conn = self.get_connection()
@@ -397,7 +574,7 @@ class DatabaseManager:
             
             user = cursor.fetchone()
             
-            if user and check_password_hash(user['pin_hash'], pin):
+            if user and _check_pin(user['pin_hash'], pin):
                 # Update last login time
                 cursor.execute('''
                     UPDATE users
@@ -422,9 +599,38 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def rotate_pin(self, user_id, current_pin, new_pin, audit=None):
+        """Replace an active user's PIN after checking the current one, on a single connection.
+        Returns False when current_pin is wrong (or the user is missing/inactive).
+        audit=(actor_id, action_type, description) logs the change in the same transaction.
+        """
+        audit = self._audit_entry(audit)
+        with self.acquire() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT pin_hash FROM users WHERE id = ? AND is_active = 1', (user_id,))
+            row = cursor.fetchone()
+            if not row or not _check_pin(row['pin_hash'], current_pin):
+                return False
+            # Hashing happens before the UPDATE opens the write transaction
+            new_pin_hash = generate_password_hash(new_pin)
+            # Matching the old hash makes a concurrent PIN change win instead of being overwritten
+            cursor.execute('UPDATE users SET pin_hash = ? WHERE id = ? AND pin_hash = ?',
+                           (new_pin_hash, user_id, row['pin_hash']))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            if audit:
+                self._insert_user_action(cursor, *audit)
+            conn.commit()
+            return True
+
     def get_users(self):
         """Get all users for admin panel"""
-        conn = self.get_connection()
+        with self.acquire() as conn:
+            return self.get_users_with(conn)
+
+    def get_users_with(self, conn):
+        """get_users() on a connection the caller already holds (e.g. inside its transaction)"""
         cursor = conn.cursor()
         
         try:
@@ -453,8 +659,12 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error fetching users: {e}")
             return []
-        finally:
-            conn.close()
+
+    def get_users_minimal_with(self, conn):
+        """id, username and role of every user (no formatting), on the caller's connection"""
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, username, role FROM users ORDER BY username')
+        return [dict(row) for row in cursor.fetchall()]
     
     def create_user(self, user_data):
         """Create a new user"""
@@ -492,8 +702,11 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def update_user(self, user_id, user_data):
-        """Update an existing user"""
+    def update_user(self, user_id, user_data, audit=None):
+        """Update an existing user.
+        audit=(actor_id, action_type, description) logs the action in the same transaction.
+        """
+        audit = self._audit_entry(audit)
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -531,6 +744,9 @@ class DatabaseManager:
                 params.append(1 if user_data['is_active'] else 0)
             
             if not updates:
+                if audit:
+                    self._insert_user_action(cursor, *audit)
+                    conn.commit()
                 return {'success': True, 'message': 'Aucune modification'}
             
             # Build update query
@@ -546,6 +762,8 @@ class DatabaseManager:
             if cursor.rowcount == 0:
                 return {'success': False, 'error': 'Utilisateur non trouvé'}
             
+            if audit:
+                self._insert_user_action(cursor, *audit)
             conn.commit()
             return {'success': True}
         except Exception as e:
@@ -555,8 +773,11 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def delete_user(self, user_id):
-        """Delete a user (soft delete by setting is_active=0)"""
+    def delete_user(self, user_id, audit=None):
+        """Delete a user (soft delete by setting is_active=0).
+        audit=(actor_id, action_type, description) logs the action in the same transaction.
+        """
+        audit = self._audit_entry(audit)
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -581,6 +802,8 @@ class DatabaseManager:
                 WHERE id = ?
             ''', (user_id,))
             
+            if audit:
+                self._insert_user_action(cursor, *audit)
             conn.commit()
             return {'success': True}
         except Exception as e:
@@ -603,13 +826,7 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute(
-                '''
-                INSERT INTO user_activity_log (user_id, action_type, description)
-                VALUES (?, ?, ?)
-                ''',
-                (user_id, action_type, description),
-            )
+            self._insert_user_action(cursor, user_id, action_type, description)
             conn.commit()
             return True
         except Exception as e:
@@ -618,6 +835,25 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def _insert_user_action(self, cursor, user_id, action_type, description):
+        """Audit-log INSERT on the caller's cursor; the caller commits"""
+        cursor.execute(
+            '''
+            INSERT INTO user_activity_log (user_id, action_type, description)
+            VALUES (?, ?, ?)
+            ''',
+            (user_id, action_type, description),
+        )
+
+    def _audit_entry(self, audit):
+        """audit unchanged when audit logging is enabled, else None (see log_user_action)"""
+        if audit is None:
+            return None
+        try:
+            return audit if self.is_audit_enabled() else None
+        except Exception:
+            return audit
+
     def is_audit_enabled(self) -> bool:
         """Return True if audit logging is enabled in app_settings (default True)."""
         conn = self.get_connection()
@@ -695,7 +931,77 @@ class DatabaseManager:
             return {'success': False, 'error': str(e)}
         finally:
             conn.close()
-    
+
+    def upsert_users_bulk(self, users, chunk_size=250):
+        """Batch version of upsert_user_by_username() for many users in one transaction.
+        Existing usernames get role/language/is_active updated (only the keys provided);
+        new ones are inserted with a hashed PIN. Entries without a username are skipped.
+        Returns dict(success: bool, created: int, updated: int)
+        """
+        def flag(val):
+            return 1 if val in (True, 1, '1', 'true', 'True') else 0
+
+        users = [u for u in users if isinstance(u, dict) and u.get('username')]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            # Which usernames already exist, looked up in chunks (SQLite caps bound variables)
+            names = list(dict.fromkeys(u['username'] for u in users))
+            existing = set()
+            for i in range(0, len(names), chunk_size):
+                chunk = names[i:i + chunk_size]
+                cursor.execute(
+                    f"SELECT username FROM users WHERE username IN ({','.join('?' * len(chunk))})", chunk
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+
+            inserts = []
+            # Runs of consecutive updates providing the same keys (input order is kept, so a
+            # repeated username ends with its last entry): a provided key is written as
+            # given (None clears it), a missing one leaves the column unchanged
+            updates = []
+            updated = 0
+            for u in users:
+                username = u['username']
+                if username in existing:
+                    keys = tuple(k for k in ('role', 'language', 'is_active') if k in u)
+                    if keys:
+                        if not updates or updates[-1][0] != keys:
+                            updates.append((keys, []))
+                        updates[-1][1].append(
+                            tuple(flag(u[k]) if k == 'is_active' else u[k] for k in keys) + (username,)
+                        )
+                    updated += 1
+                else:
+                    # Hash only for users that are really created (a repeat updates the new row)
+                    inserts.append((
+                        username,
+                        generate_password_hash(u.get('pin') or '1234'),
+                        u.get('role', 'employee'),
+                        u.get('language', 'fr'),
+                    ))
+                    existing.add(username)
+
+            if not conn.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+            for i in range(0, len(inserts), chunk_size):
+                cursor.executemany(
+                    'INSERT INTO users (username, pin_hash, role, language) VALUES (?, ?, ?, ?)',
+                    inserts[i:i + chunk_size],
+                )
+            for keys, rows in updates:
+                query = f"UPDATE users SET {', '.join(f'{k} = ?' for k in keys)} WHERE username = ?"
+                for i in range(0, len(rows), chunk_size):
+                    cursor.executemany(query, rows[i:i + chunk_size])
+            conn.commit()
+            return {'success': True, 'created': len(inserts), 'updated': updated}
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error upserting users in bulk: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            conn.close()
+
     def get_recent_activities(self, limit=20):
         """Get recent user activities for dashboard. Supports action_time or created_at."""
         conn = self.get_connection()
@@ -715,14 +1021,21 @@ class DatabaseManager:
 
             if preferred:
                 select_time = f"a.{preferred} AS created_at"
+                select_age = ACTIVITY_AGE_SQL.format(column=f'a.{preferred}')
+                select_formatted = ACTIVITY_TIME_SQL.format(column=f'a.{preferred}')
                 order_by = f"a.{preferred} DESC"
             else:
                 # Fall back to id ordering when no timestamp is available
                 select_time = 'a.id AS created_at'
+                select_age = 'NULL'
+                select_formatted = 'a.id'
                 order_by = 'a.id DESC'
 
             query = f'''
-                SELECT a.id, a.action_type, a.description, {select_time}, u.username
+                SELECT a.id, a.action_type, a.description, {select_time}, u.username,
+                       {ACTIVITY_TYPE_SQL} AS activity_type,
+                       {select_age} AS age_seconds,
+                       {select_formatted} AS formatted_time
                 FROM user_activity_log a
                 JOIN users u ON a.user_id = u.id
                 ORDER BY {order_by}
@@ -730,21 +1043,7 @@ class DatabaseManager:
             '''
 
             cursor.execute(query, (limit,))
-            rows = cursor.fetchall()
-
-            activities = []
-            for row in rows:
-                activity = dict(row)
-                # Format date safe if present
-                if 'created_at' in activity and activity['created_at']:
-                    try:
-                        action_time = datetime.fromisoformat(str(activity['created_at']).replace('Z', '+00:00'))
-                        activity['formatted_time'] = action_time.strftime('%d/%m/%Y %H:%M')
-                    except Exception:
-                        activity['formatted_time'] = activity.get('created_at')
-                activities.append(activity)
-
-            return activities
+            return [dict(row) for row in cursor.fetchall()]
         except Exception as e:
             logger.error(f"Error fetching recent activities: {e}")
             return []
@@ -1018,7 +1317,10 @@ class DatabaseManager:
                     )
                 except Exception:
                     return []
-            return [dict(r) for r in cursor.fetchall()]
+            # Both queries return (id, name, phone): zip plain tuples instead of copying Rows
+            keys = ('id', 'name', 'phone')
+            cursor.row_factory = None
+            return [dict(zip(keys, r)) for r in cursor]
         except Exception as e:
             logger.error(f"Error fetching customers list: {e}")
             return []
@@ -1372,6 +1674,64 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def get_dashboard_snapshot(self, low_stock_limit=5):
+        """Everything the dashboard /stats card needs, from one aggregate query plus the
+        low-stock list, on a single connection. Same figures as get_total_products(),
+        get_today_sales(), get_pending_debts(), get_overdue_debts(), get_total_revenue()
+        and get_cash_balance(); a metric whose table or columns are missing reads 0, and
+        a failing metric doesn't zero the others.
+        """
+        with self.acquire() as conn:
+            cursor = conn.cursor()
+            columns = {}
+            for table, _ in _DASHBOARD_METRICS.values():
+                if table not in columns:
+                    cursor.execute(f'PRAGMA table_info({table})')
+                    columns[table] = {col[1] for col in cursor.fetchall()}
+            expense_filter = 'WHERE is_deleted = 0' if 'is_deleted' in columns['expenses'] else ''
+            params = {'today': datetime.now().strftime('%Y-%m-%d')}
+
+            # Only the metrics whose columns exist go into the combined query
+            selects = {
+                key: sql.format(expense_filter=expense_filter)
+                for key, (table, sql) in _DASHBOARD_METRICS.items()
+                if _DASHBOARD_METRIC_COLUMNS[key] <= columns[table]
+            }
+            values = dict.fromkeys(_DASHBOARD_METRICS)
+            if selects:
+                try:
+                    cursor.execute('SELECT ' + ', '.join(f'({sql}) AS {key}' for key, sql in selects.items()), params)
+                    values.update(dict(cursor.fetchone()))
+                except Exception as e:
+                    # Retry one metric at a time so a single bad sub-query only loses its own card
+                    logger.error(f"Error fetching dashboard snapshot, retrying per metric: {e}")
+                    for key, sql in selects.items():
+                        try:
+                            cursor.execute(sql, params)
+                            values[key] = cursor.fetchone()[0]
+                        except Exception as metric_error:
+                            logger.error(f"Error fetching dashboard metric {key}: {metric_error}")
+
+            snapshot = {key: values[key] or 0 for key in _DASHBOARD_COUNTS}
+            for key in ('today_sales', 'yesterday_sales', 'pending_debts', 'overdue_debts', 'total_revenue'):
+                snapshot[key] = float(values[key] or 0)
+            snapshot['cash_balance'] = snapshot['total_revenue'] - float(values['total_expenses'] or 0)
+
+            try:
+                cursor.execute('''
+                    SELECT 
+                        id, name, sku, category, current_stock, reorder_level
+                    FROM products
+                    WHERE is_active = 1 AND current_stock <= reorder_level
+                    ORDER BY (current_stock * 1.0 / reorder_level)
+                    LIMIT ?
+                ''', (low_stock_limit,))
+                snapshot['low_stock_items'] = [dict(r) for r in cursor.fetchall()]
+            except Exception as e:
+                logger.error(f"Error fetching low stock items: {e}")
+                snapshot['low_stock_items'] = []
+            return snapshot
+    
     def get_top_selling_products(self, days=30, limit=5):
         """Get top selling products for dashboard.
         Prefer sale_items (new schema); gracefully fallback to sale_details if needed.
@@ -1512,7 +1872,11 @@ class DatabaseManager:
     
     def get_app_settings(self):
         """Get application settings"""
-        conn = self.get_connection()
+        with self.acquire() as conn:
+            return self.get_app_settings_with(conn)
+
+    def get_app_settings_with(self, conn):
+        """get_app_settings() on a connection the caller already holds"""
         cursor = conn.cursor()
         
         try:
@@ -1569,8 +1933,6 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error fetching app settings: {e}")
             return {}
-        finally:
-            conn.close()
     
     def set_app_settings(self, settings_data):
         """Update application settings"""
@@ -1612,17 +1974,14 @@ class DatabaseManager:
                     )
 
             # Upsert extra keys into app_settings (store JSON when needed)
+            # ON CONFLICT updates the row in place; REPLACE would delete and re-insert it
             if kv_updates:
-                for key, value in kv_updates.items():
-                    to_store = value
-                    if isinstance(value, (dict, list)):
-                        to_store = json.dumps(value)
-                    else:
-                        to_store = str(value)
-                    cursor.execute(
-                        "REPLACE INTO app_settings (key, value) VALUES (?, ?)",
-                        (key, to_store)
-                    )
+                cursor.executemany(
+                    "INSERT INTO app_settings (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    [(key, json.dumps(value) if isinstance(value, (dict, list)) else str(value))
+                     for key, value in kv_updates.items()]
+                )
             
             conn.commit()
             return {'success': True}
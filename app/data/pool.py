@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite connection pool for Quincaillerie & SME Management App
+Keeps a few warm connections per database file so requests don't reopen it
+"""
+
+import queue
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# Applied once when a physical connection is opened
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+)
+
+# Prepared statements kept per connection (sqlite3 default: 128). Keyed on the SQL text,
+# so handlers that reuse constant statement strings skip re-parsing on warm connections
+STATEMENT_CACHE_SIZE = 512
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool"""
+
+    def close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            return super().close()
+        pool.release(self)
+
+
+class ConnectionPool:
+    """Small LIFO pool of SQLite connections for one database file.
+
+    Each caller gets a connection of its own (nested get_connection() calls
+    never share one), and close() rolls back anything left uncommitted before
+    the connection is reused - the same outcome as really closing it.
+    """
+
+    def __init__(self, db_path, max_size=5):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._total_acquisitions = 0
+        self._opened = 0
+
+    def _connect(self):
+        logger.info(f"Opening database connection at: {self.db_path}")
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not apply '{pragma}': {e}")
+        conn._pool = self
+        conn._checked_out = False
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    def get(self):
+        """Borrow a connection, opening a new one if none is idle"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        conn._checked_out = True
+        with self._lock:
+            self._active += 1
+            self._total_acquisitions += 1
+        return conn
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.get()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def release(self, conn):
+        """Return a connection to the pool (called by PooledConnection.close)"""
+        if not conn._checked_out:
+            # Already released - a second close() must not hand it out twice
+            return
+        conn._checked_out = False
+        with self._lock:
+            self._active -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            self._discard(conn)
+
+    def _discard(self, conn):
+        conn._pool = None
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        """Usage counters for health checks"""
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'max_size': self.max_size,
+                'active': self._active,
+                'idle': self._idle.qsize(),
+                'total': self._opened,
+                'total_acquisitions': self._total_acquisitions,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """Return the process-wide pool for db_path, creating it on first use"""
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = _pools[db_path] = ConnectionPool(db_path)
+    return pool
+
+
+def get_conn(db_path):
+    """Borrow a pooled connection for db_path; close() returns it"""
+    return get_pool(db_path).get()
+
+
+def acquire(db_path):
+    """Context manager borrowing a pooled connection for db_path"""
+    return get_pool(db_path).acquire()
+
@@ -8,7 +8,7 @@ import os
 import sys
 from faker import Faker
 import random
-from datetime import datetime, timedelta
+from datetime import timedelta
 import sqlite3
 
 # Use environment variables for database path
@@ -20,8 +20,12 @@ DB_PATH = os.path.abspath(env_path or default_path)
 
 fake = Faker('fr_FR')
 
-conn = sqlite3.connect(DB_PATH)
+# Larger statement cache: the same parameterized INSERTs are reused for every row
+conn = sqlite3.connect(DB_PATH, cached_statements=256)
 cursor = conn.cursor()
+# WAL + relaxed sync: the seed run is bulk writes, no need to fsync every commit
+cursor.execute('PRAGMA journal_mode=WAL')
+cursor.execute('PRAGMA synchronous=NORMAL')
 
 # Helper: get admin user id
 cursor.execute("SELECT id FROM users WHERE role='admin' LIMIT 1")
@@ -73,52 +77,60 @@ for _ in range(50):
     customer_name = fake.name()
     customer_phone = fake.phone_number()
     invoice_number = f"INV{fake.unique.random_int(min=1000, max=9999)}"
-    total_amount = 0
-    paid_amount = 0
     payment_method = fake.random_element(['cash', 'credit', 'mobile'])
-    is_credit = 1 if payment_method == 'credit' else 0
-    if is_credit:
-        if isinstance(sale_date, str):
-            sale_date_obj = datetime.strptime(sale_date, '%Y-%m-%d')
-        else:
-            sale_date_obj = sale_date
-        credit_due_date = (sale_date_obj + timedelta(days=30)).strftime('%Y-%m-%d')
-    else:
-        credit_due_date = None
+    # Derive every credit-related field from a single comparison
+    is_credit = payment_method == 'credit'
+    credit_due_date = (sale_date + timedelta(days=30)).isoformat() if is_credit else None
     status = fake.random_element(['completed', 'pending'])
     notes = fake.sentence(nb_words=6)
-    # Add sale
-    sales.append((sale_date, invoice_number, customer_name, customer_phone, 0, 0, payment_method, is_credit, credit_due_date, status, notes, admin_id))
+    # Add sale (date formatted once; totals are filled in below)
+    sales.append((sale_date.isoformat(), invoice_number, customer_name, customer_phone, 0, 0, payment_method, int(is_credit), credit_due_date, status, notes, admin_id))
 
 conn.commit()
 
 # Insert sales and sale_items
+# Load product prices once instead of querying per sale item
+cursor.execute('SELECT id, sale_price, purchase_price FROM products')
+prices = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
 
+# Compute items and totals up front so each sale is inserted once, with its final amounts
+sale_rows = []
+items_per_sale = []
 for sale in sales:
-    cursor.execute('''
-        INSERT INTO sales (sale_date, invoice_number, customer_name, customer_phone, total_amount, paid_amount,
-                           payment_method, is_credit, credit_due_date, status, notes, created_by)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sale)
-    sale_id = cursor.lastrowid
-    # Add 1-4 items per sale
+    items = []
     total_amount = 0
-    paid_amount = 0
+    # Add 1-4 items per sale
     for _ in range(random.randint(1, 4)):
         product_id = random.randint(1, len(products))
         quantity = random.randint(1, 5)
-        cursor.execute('SELECT sale_price, purchase_price FROM products WHERE id=?', (product_id,))
-        row = cursor.fetchone()
-        if not row:
+        price = prices.get(product_id)
+        if not price:
             continue
-        unit_price, purchase_price = row
+        unit_price, purchase_price = price
         total_price = round(unit_price * quantity, 2)
         profit_margin = round((unit_price - purchase_price) * quantity, 2)
-        sale_items.append((sale_id, product_id, quantity, unit_price, total_price, profit_margin))
+        items.append((product_id, quantity, unit_price, total_price, profit_margin))
         total_amount += total_price
-    paid_amount = total_amount if sale[5] != 'credit' else 0
-    # Update sale totals
-    cursor.execute('UPDATE sales SET total_amount=?, paid_amount=? WHERE id=?', (total_amount, paid_amount, sale_id))
+    # Credit sales start unpaid (sale[7] is the is_credit flag)
+    paid_amount = 0 if sale[7] else total_amount
+    sale_rows.append(sale[:4] + (total_amount, paid_amount) + sale[6:])
+    items_per_sale.append(items)
+
+# One transaction for the whole batch: a single journal sync instead of one per row
+cursor.execute('BEGIN')
+cursor.execute('SELECT COALESCE(MAX(id), 0) FROM sales')
+last_sale_id = cursor.fetchone()[0]
+cursor.executemany('''
+    INSERT INTO sales (sale_date, invoice_number, customer_name, customer_phone, total_amount, paid_amount,
+                       payment_method, is_credit, credit_due_date, status, notes, created_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+''', sale_rows)
+# Row ids are allocated in insertion order within the transaction
+cursor.execute('SELECT id FROM sales WHERE id > ? ORDER BY id', (last_sale_id,))
+sale_ids = [row[0] for row in cursor.fetchall()]
+
+for sale_id, items in zip(sale_ids, items_per_sale):
+    sale_items.extend((sale_id,) + item for item in items)
 
 cursor.executemany('''
     INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total_price, profit_margin)
@@ -9,11 +9,13 @@ def main():
     conn = db.get_connection()
     cursor = conn.cursor()
 
+    # Read the table list once; both checks below reuse it
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = [row[0] for row in cursor.fetchall()]
+
     # Check if sale_details table exists
     print('=== CHECKING SALE_DETAILS TABLE ===')
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sale_details'")
-    result = cursor.fetchone()
-    if result:
+    if 'sale_details' in tables:
         print('sale_details table EXISTS')
         cursor.execute('PRAGMA table_info(sale_details)')
         columns = cursor.fetchall()
@@ -35,10 +37,8 @@ def main():
 
     # Check all table names
     print('\n=== ALL TABLES IN DATABASE ===')
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
     for table in tables:
-        print(f'  {table[0]}')
+        print(f'  {table}')
 
     conn.close()
 
@@ -45,7 +45,7 @@ class StockPredictor:
                 LEFT JOIN sale_items si ON p.id = si.product_id
                 LEFT JOIN sales s ON si.sale_id = s.id
                 WHERE p.is_active = 1 
-                AND (s.sale_date IS NULL OR DATE(s.sale_date) >= DATE('now', '-60 days'))
+                AND (s.sale_date IS NULL OR s.sale_date >= DATE('now', '-60 days'))
                 GROUP BY p.id
                 HAVING p.current_stock > 0
             '''
@@ -154,7 +154,7 @@ class StockPredictor:
                 LEFT JOIN sale_items si ON p.id = si.product_id
                 LEFT JOIN sales s ON si.sale_id = s.id
                 WHERE p.is_active = 1 
-                AND (s.sale_date IS NULL OR DATE(s.sale_date) >= DATE('now', '-90 days'))
+                AND (s.sale_date IS NULL OR s.sale_date >= DATE('now', '-90 days'))
                 GROUP BY p.id
             '''
             
@@ -305,7 +305,7 @@ class SalesForecaster:
                        SUM(total_amount) as daily_revenue,
                        AVG(total_amount) as avg_transaction
                 FROM sales
-                WHERE DATE(sale_date) >= DATE('now', '-60 days')
+                WHERE sale_date >= DATE('now', '-60 days')
                 GROUP BY DATE(sale_date)
                 ORDER BY date
             '''
@@ -398,7 +398,7 @@ class SalesForecaster:
                        COUNT(DISTINCT s.id) as transactions
                 FROM sale_items si
                 JOIN sales s ON si.sale_id = s.id
-                WHERE si.product_id = ? AND DATE(s.sale_date) >= DATE('now', '-60 days')
+                WHERE si.product_id = ? AND s.sale_date >= DATE('now', '-60 days')
                 GROUP BY DATE(s.sale_date)
                 ORDER BY date
             '''
@@ -494,7 +494,7 @@ class SalesForecaster:
                     SUM(total_amount) as revenue,
                     AVG(total_amount) as avg_transaction
                 FROM sales
-                WHERE DATE(sale_date) >= DATE('now', '-30 days')
+                WHERE sale_date >= DATE('now', '-30 days')
                 GROUP BY strftime('%w', sale_date)
                 ORDER BY day_number
             '''
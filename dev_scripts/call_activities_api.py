@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
-import urllib.request, json
+import urllib.request, json, os
+try:
+    import orjson
+except ImportError:
+    orjson = None
 url='http://127.0.0.1:5000/api/dashboard/activities?limit=50'
+# Full pretty-printed dump only with VERBOSE_DIAG=1; otherwise a short summary
+VERBOSE = os.environ.get('VERBOSE_DIAG') == '1'
 try:
     with urllib.request.urlopen(url, timeout=10) as r:
-        text = r.read().decode('utf-8')
+        raw = r.read()
         try:
-            data = json.loads(text)
-            print(json.dumps(data, ensure_ascii=False, indent=2))
+            data = json.loads(raw)
         except Exception:
-            print('Non-JSON response:', text)
+            print('Non-JSON response:', raw.decode('utf-8', 'replace'))
+        else:
+            if VERBOSE:
+                if orjson is not None:
+                    print(orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8'))
+                else:
+                    print(json.dumps(data, ensure_ascii=False, indent=2))
+            else:
+                activities = data.get('activities', []) if isinstance(data, dict) else []
+                print('success:', data.get('success') if isinstance(data, dict) else None)
+                print('activities:', len(activities), 'first ids:', [a.get('id') for a in activities[:3]])
 except Exception as e:
     print('HTTP error:', e)
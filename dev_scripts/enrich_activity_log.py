@@ -45,32 +45,31 @@ conn = dbm.get_connection()
 cursor = conn.cursor()
 
 # Ensure columns exist: table_affected TEXT, record_id INTEGER, meta TEXT
+# Check the schema first so ALTER TABLE only runs for columns that are really missing
 cursor.execute("PRAGMA table_info(user_activity_log)")
-cols = [c[1] for c in cursor.fetchall()]
+cols = {c[1] for c in cursor.fetchall()}
 
-added = []
-if 'table_affected' not in cols:
-    try:
-        cursor.execute("ALTER TABLE user_activity_log ADD COLUMN table_affected TEXT")
-        added.append('table_affected')
-    except Exception as e:
-        print(f"Failed to add table_affected: {e}")
-if 'record_id' not in cols:
-    try:
-        cursor.execute("ALTER TABLE user_activity_log ADD COLUMN record_id INTEGER")
-        added.append('record_id')
-    except Exception as e:
-        print(f"Failed to add record_id: {e}")
-if 'meta' not in cols:
+wanted = (
+    ('table_affected', 'TEXT'),
+    ('record_id', 'INTEGER'),
+    ('meta', 'TEXT'),
+)
+missing = [(name, col_type) for name, col_type in wanted if name not in cols]
+added = [name for name, _ in missing]
+
+if missing:
     try:
-        cursor.execute("ALTER TABLE user_activity_log ADD COLUMN meta TEXT")
-        added.append('meta')
+        # sqlite3 doesn't open a transaction for ALTER TABLE on its own; the explicit
+        # BEGIN makes the columns land together or, after rollback(), not at all
+        cursor.execute("BEGIN")
+        for name, col_type in missing:
+            cursor.execute(f"ALTER TABLE user_activity_log ADD COLUMN {name} {col_type}")
+        conn.commit()
+        print(f"Added columns: {', '.join(added)}")
     except Exception as e:
-        print(f"Failed to add meta: {e}")
-
-if added:
-    conn.commit()
-    print(f"Added columns: {', '.join(added)}")
+        conn.rollback()
+        print(f"Failed to add columns: {e}")
+        sys.exit(1)
 else:
     print("Columns already present or none added.")
 
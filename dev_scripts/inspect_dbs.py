@@ -1,4 +1,5 @@
 import sqlite3, os, json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 candidates = [
     Path(r"c:/Users/DAH/Downloads/Quincaillerie & SME Management App/app/quincaillerie.db"),
@@ -6,8 +7,8 @@ candidates = [
     Path(r"c:/Users/DAH/Downloads/Quincaillerie & SME Management App/app/db/quincaillerie.db"),
     Path(r"c:/Users/DAH/Downloads/Quincaillerie & SME Management App/db/quincaillerie.db"),
 ]
-out = []
-for p in candidates:
+
+def inspect(p):
     item = {"path": str(p), "exists": p.exists(), "tables": None, "error": None}
     if p.exists():
         try:
@@ -18,5 +19,10 @@ for p in candidates:
             conn.close()
         except Exception as e:
             item['error'] = str(e)
-    out.append(item)
+    return item
+
+# Each check is I/O bound (sqlite releases the GIL), so run them side by side;
+# map() keeps results in candidate order and printing happens once at the end
+with ThreadPoolExecutor(max_workers=len(candidates)) as ex:
+    out = list(ex.map(inspect, candidates))
 print(json.dumps(out, ensure_ascii=False, indent=2))
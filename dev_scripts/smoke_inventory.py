@@ -1,18 +1,27 @@
 import requests, sys, json
 
 BASE = 'http://127.0.0.1:5000'
+# Fixed endpoint URLs, built once
+ENDPOINTS = {
+    'autologin': BASE + '/autologin/inventory',
+    'stats': BASE + '/api/inventory/stats',
+    'products': BASE + '/api/inventory/products',
+    'low_stock': BASE + '/api/inventory/low-stock',
+    'adjust_stock': BASE + '/api/inventory/adjust-stock',
+    'inventory_count': BASE + '/api/inventory/inventory-count',
+}
 s = requests.Session()
 
 print('Autologin…', end=' ')
-resp = s.get(f'{BASE}/autologin/inventory', allow_redirects=True)
+resp = s.get(ENDPOINTS['autologin'], allow_redirects=True)
 print(resp.status_code)
 
 # 1) Stats
-r = s.get(f'{BASE}/api/inventory/stats')
+r = s.get(ENDPOINTS['stats'])
 print('stats:', r.status_code, r.text[:200])
 
 # 2) Products
-r = s.get(f'{BASE}/api/inventory/products')
+r = s.get(ENDPOINTS['products'])
 print('products:', r.status_code)
 try:
     data = r.json()
@@ -22,14 +31,14 @@ except Exception:
 print('products count:', len(products))
 
 # 3) Low stock
-r = s.get(f'{BASE}/api/inventory/low-stock')
+r = s.get(ENDPOINTS['low_stock'])
 print('low-stock:', r.status_code, r.text[:150])
 
 # 4) If we have a product, fetch details and try a dry adjust scenario (set same stock so no change)
 if products:
     pid = products[0].get('id')
     print('first product id:', pid)
-    r = s.get(f'{BASE}/api/inventory/products/{pid}')
+    r = s.get(f"{ENDPOINTS['products']}/{pid}")
     print('product details:', r.status_code)
     try:
         det = r.json().get('product', {})
@@ -43,7 +52,7 @@ if products:
         'reason': 'smoke_test',
         'notes': 'no-op set to current'
     }
-    r = s.post(f'{BASE}/api/inventory/adjust-stock', json=payload)
+    r = s.post(ENDPOINTS['adjust_stock'], json=payload)
     print('adjust-stock (no-op):', r.status_code, r.text[:120])
 
 # 5) Inventory count (no adjust)
@@ -55,7 +64,7 @@ count_payload = {
         {'product_id': products[0]['id'], 'counted_qty': products[0].get('current_stock', 0)}
     ] if products else []
 }
-r = s.post(f'{BASE}/api/inventory/inventory-count', json=count_payload)
+r = s.post(ENDPOINTS['inventory_count'], json=count_payload)
 print('inventory-count:', r.status_code, r.text[:160])
 
 print('DONE')
@@ -0,0 +1,114 @@
+import os
+import sys
+import pytest
+from flask import Response
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.app import app
+from app.data.pool import ConnectionPool
+
+# The blueprints run as the api.* modules loaded by app.app
+import api.admin as admin
+import api.dashboard as dashboard
+
+
+@pytest.fixture
+def admin_client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_role'] = 'admin'
+        yield client
+
+
+def test_pool_release_rolls_back_and_reuses_connection(tmp_path):
+    """close() hands the connection back with uncommitted work rolled back"""
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2)
+    conn = pool.get()
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    conn.commit()
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.close()
+    conn.close()  # a second close must not return it twice
+    assert pool.stats()['active'] == 0
+    assert pool.stats()['idle'] == 1
+
+    again = pool.get()
+    assert again is conn
+    assert again.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    again.close()
+
+
+def test_poll_cache_cleared_after_write(monkeypatch):
+    """A cached dashboard body is served until a successful write request"""
+    calls = []
+    monkeypatch.setattr(dashboard.db_manager, 'get_top_selling_products',
+                        lambda *a, **k: calls.append(1) or [{'id': 1, 'name': 'Marteau'}])
+    dashboard._poll_cache.clear()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        assert client.get('/api/dashboard/top-products').get_json()['success'] is True
+        client.get('/api/dashboard/top-products')
+        assert len(calls) == 1
+
+        with app.test_request_context('/api/sales', method='POST'):
+            dashboard._invalidate_poll_cache(Response(status=200))
+        client.get('/api/dashboard/top-products')
+        assert len(calls) == 2
+
+
+def test_backup_job_status_flow(monkeypatch, tmp_path, admin_client):
+    """The job id from the POST reports done once the backup file is published"""
+    monkeypatch.setattr(admin, 'BACKUP_DIR', str(tmp_path))
+    monkeypatch.setattr(admin.sync_manager, 'stream_offline_data', lambda fp: fp.write(b'{}'))
+    monkeypatch.setattr(admin.db_manager, 'log_user_action', lambda *a, **k: None)
+
+    resp = admin_client.post('/api/admin/backups')
+    assert resp.status_code == 202
+    job_id = resp.get_json()['job_id']
+    admin._BACKUP_EXECUTOR.submit(lambda: None).result()
+
+    status = admin_client.get(f'/api/admin/backups/{job_id}/status').get_json()
+    assert status['status'] == 'done'
+    assert (tmp_path / status['backup_id']).exists()
+    assert not list(tmp_path.glob('*.job'))
+    assert admin_client.get('/api/admin/backups/backup_00000000_000000/status').status_code == 404
+
+
+def test_backup_job_status_reports_error(monkeypatch, tmp_path, admin_client):
+    def fail(fp):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(admin, 'BACKUP_DIR', str(tmp_path))
+    monkeypatch.setattr(admin.sync_manager, 'stream_offline_data', fail)
+
+    job_id = admin_client.post('/api/admin/backups').get_json()['job_id']
+    admin._BACKUP_EXECUTOR.submit(lambda: None).result()
+
+    status = admin_client.get(f'/api/admin/backups/{job_id}/status').get_json()
+    assert status['status'] == 'error'
+    assert status['error'] == 'disk full'
+    assert not list(tmp_path.glob('*.json*'))
+
+
+def test_set_app_settings_upserts_keys(monkeypatch, tmp_path):
+    """Repeated keys are updated in place and the cached settings follow the write"""
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    monkeypatch.delenv('DATABASE_PATH', raising=False)
+    manager = admin.FixedDatabaseManager(str(tmp_path / 'settings.db'))
+    manager.init_database()
+    manager.reload_schema()
+
+    assert manager.set_app_settings({'zz_mode': 'a', 'zz_list': [1, 2]})['success'] is True
+    assert manager.get_app_settings()['zz_mode'] == 'a'
+    assert manager.set_app_settings({'zz_mode': 'b'})['success'] is True
+
+    settings = manager.get_app_settings()
+    assert settings['zz_mode'] == 'b'
+    assert settings['zz_list'] == [1, 2]
+    with manager.acquire() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM app_settings WHERE key = 'zz_mode'").fetchone()[0]
+    assert count == 1